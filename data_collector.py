@@ -1,12 +1,24 @@
 import argparse
+import asyncio
+import concurrent.futures
+import copy
+import datetime
 import logging
+import math
 import subprocess
 import threading
 import time
+import re
 import shlex
+import shutil
 import os
 
-from utils import interval_string_to_seconds
+from collections import defaultdict
+from experiments import ExperimentSpec, SweepManifest, cell_hash, load_matrix
+from k8s_metrics import create_metrics_source
+from sample_store import SAMPLES_FILENAME, ColumnarSampleWriter
+from stack_diff import apply_incremental
+from utils import format_age, interval_string_to_seconds, parse_quantity
 
 import yaml
 import sys
@@ -15,11 +27,15 @@ logging.basicConfig(level=logging.INFO, stream=sys.stdout)
 
 # TODO: dynamically get microservice names
 microservices = []
+# The subset of microservices that got an HPA in the generated config
+autoscaled = []
 
 hpa_config_file = "hpa_config.yaml"
 locustfile_path = "./locustfile.py"
 locust_venv = "./venv/bin" #~/CLionProjects/microservices-demo/src/loadgenerator/venv/bin"
 frontend_external_ip = "128.110.96.164:30080/"
+LOCUST_WEB_PORT = 8089
+LOCUST_MASTER_PORT = 5557
 
 class LiteralDumper(yaml.SafeDumper):
     pass
@@ -37,33 +53,72 @@ LiteralDumper.ignore_aliases = lambda *args: True
 
 yaml_width = 4096
 
-def create_hpa_yaml(args):
-    global microservices
-    DEF_all = {"req": {"cpu": "1000m", "memory": "2Gi"}, "lim": {"cpu": "2000m", "memory": "2Gi"}}
-    # Note: teastore-db is MySQL, similar to mongodb, often excluded from HPA or given special limits,
-    # but we'll use DEF_all as a default and keep it simple.
-    # DEF_db = {"req": {"cpu": "2000m", "memory": "512Mi"}, "lim": {"cpu": "2000m", "memory": "512Mi"}}
+# Parsed manifests, read once per process and reused by every experiment
+manifest_cache = {}
+
+def load_manifest(fn):
+    if fn not in manifest_cache:
+        with open(fn, "r") as f:
+            manifest_cache[fn] = list(yaml.safe_load_all(f))
+    return copy.deepcopy(manifest_cache[fn])
 
-    # Build metrics list from args
+def spec_from_args(args):
+    """
+    The single experiment described by the command line flags.
+    """
     metrics = []
     if getattr(args, "cpu", False):
-        metrics.append({
-            "type": "Resource",
-            "resource": {"name": "cpu", "target": {"type": "Utilization", "averageUtilization": 90}}
-        })
+        metrics.append({"name": "cpu", "target": args.threshold})
     if getattr(args, "memory", False):
-        metrics.append({
-            "type": "Resource",
-            "resource": {"name": "memory", "target": {"type": "Utilization", "averageUtilization": 90}}
-        })
+        metrics.append({"name": "memory", "target": args.threshold})
+    return ExperimentSpec(metrics=metrics, duration=args.time)
+
+def set_jvm_options(pod_spec, value):
+    """
+    Set (or with value None, remove) JAVA_TOOL_OPTIONS on every container.
+    """
+    for c in (pod_spec.get("containers", []) or []):
+        env = [e for e in (c.get("env") or []) if e.get("name") != "JAVA_TOOL_OPTIONS"]
+        if value is not None:
+            env.append({"name": "JAVA_TOOL_OPTIONS", "value": value})
+        if env:
+            c["env"] = env
+        else:
+            c.pop("env", None)
+
+def config_file_for(namespace):
+    """
+    Generated config of one namespace; the default namespace keeps hpa_config.yaml.
+    """
+    return hpa_config_file if namespace == "default" else f"hpa_config.{namespace}.yaml"
+
+def namespace_for(name):
+    """
+    A valid Kubernetes namespace name (RFC 1123 label) derived from an experiment name.
+    """
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")[:63].rstrip("-") or "default"
+
+def frontend_for(frontend, node_port):
+    host = frontend.rstrip("/").rsplit(":", 1)[0]
+    return f"{host}:{node_port}/"
+
+def create_hpa_yaml(spec, namespace="default", node_port=None, config_file=None):
+    """
+    Generate the config of one experiment from its spec. Outside the default
+    namespace the config also creates its namespace, so deleting the config
+    removes everything, and node_port replaces the fixed WebUI NodePort so
+    stacks in several namespaces do not collide.
+    """
+    global microservices
+    microservices.clear()
+    autoscaled.clear()
+    DEF_all = spec.resources
 
     all_configs = []
 
-    # 📝 Minimal change: Target only the manifest.yaml file
-    fn = "manifest.yaml"
+    fn = spec.manifest
     try:
-        with open(fn, "r") as f:
-            docs = list(yaml.safe_load_all(f))
+        docs = load_manifest(fn)
     except FileNotFoundError:
         print(f"Error: {fn} not found.")
         return
@@ -83,101 +138,78 @@ def create_hpa_yaml(args):
                     lm["cpu"] = DEF["lim"]["cpu"]
                     lm["memory"] = DEF["lim"]["memory"]
 
+            if spec.node_selector:
+                pod_spec["nodeSelector"] = dict(spec.node_selector)
+
             name = (d.get("metadata") or {}).get("name")
+            if name in spec.jvm_options:
+                set_jvm_options(pod_spec, spec.jvm_options[name])
             if name:
                 microservices.append(name)
-    # Add an HPA for Deployments when metrics requested
-    if metrics:
-        new_docs = []
+    # One HPA per autoscaled Deployment, following its policy (spec.autoscaling)
+    new_docs = []
+    for name in microservices:
+        hpa_spec = spec.hpa_spec(name)
+        if hpa_spec is not None:
+            new_docs.append({
+                "apiVersion": "autoscaling/v2",
+                "kind": "HorizontalPodAutoscaler",
+                "metadata": {"name": f"{name}"},
+                "spec": hpa_spec,
+            })
+            autoscaled.append(name)
+    docs.extend(new_docs)  # Add all new HPAs to the documents list
+
+    if node_port is not None:
+        for d in docs:
+            if isinstance(d, dict) and d.get("kind") == "Service":
+                for port in ((d.get("spec") or {}).get("ports") or []):
+                    if "nodePort" in port:
+                        port["nodePort"] = node_port
+
+    if namespace != "default":
+        all_configs.append({"apiVersion": "v1", "kind": "Namespace", "metadata": {"name": namespace}})
         for d in docs:
-            if isinstance(d, dict) and d.get("kind") == "Deployment":
-                md = d.get("metadata", {}) or {}
-                # 📌 Use the deployment name directly
-                name = md.get("name")
-
-                # Optionally, exclude the database from HPA (like 'mongodb' exclusion)
-                # if name == "teastore-db":
-                #     continue
-
-                if name:
-                    pMin, pMax = 1, 20
-                    new_docs.append({  # Append to new_docs to avoid modifying docs while iterating
-                        "apiVersion": "autoscaling/v2",
-                        "kind": "HorizontalPodAutoscaler",
-                        "metadata": {"name": f"{name}"},  # Use a distinct HPA name
-                        "spec": {
-                            "scaleTargetRef": {"apiVersion": "apps/v1", "kind": "Deployment", "name": name},
-                            "minReplicas": pMin,
-                            "maxReplicas": pMax,
-                            "metrics": metrics,
-                            # "behavior": {
-                            #     "scaleUp": {
-                            #         "stabilizationWindowSeconds": 300,
-                            #         "policies": [
-                            #             {
-                            #                 "type": "Percent",
-                            #                 "value": 100,
-                            #                 "periodSeconds": 60,
-                            #             }
-                            #         ],
-                            #     },
-                            #     "scaleDown": {
-                            #         "stabilizationWindowSeconds": 300,
-                            #         "policies": [
-                            #             {
-                            #                 "type": "Percent",
-                            #                 "value": 50,
-                            #                 "periodSeconds": 60,
-                            #             }
-                            #         ],
-                            #     },
-                            # },
-                        }
-                    })
-        docs.extend(new_docs)  # Add all new HPAs to the documents list
+            if isinstance(d, dict):
+                d.setdefault("metadata", {})["namespace"] = namespace
 
     all_configs.extend(docs)
 
-    with open(hpa_config_file, "w") as f:
+    with open(config_file or config_file_for(namespace), "w") as f:
         yaml.dump_all(all_configs, f, default_flow_style=False, Dumper=LiteralDumper, width=yaml_width)
 
     return DEF_all
 
-def parse_quantity(quantity):
-    """
-    Parse kubernetes resource quantity to raw value.
-    m -> milli (values / 1000)
-    Ki -> 1024
-    Mi -> 1024^2
-    Gi -> 1024^3
-    """
-    if not quantity:
-        return 0
-    
-    # Handle millicores
-    if quantity.endswith('m'):
-        return int(quantity[:-1])
-    
-    # Handle limits (bytes)
-    multipliers = {
-        'Ki': 1024,
-        'Mi': 1024 ** 2,
-        'Gi': 1024 ** 3,
-        'Ti': 1024 ** 4
+def build_hpa_sample(microservice, ref, cpu_usage, mem_usage, pod_count, cpu_target, mem_target,
+                     min_pods, max_pods, replicas, age, DEF_all):
+    """
+    Turn raw usage sums and HPA fields into one sample dict. Utilization is
+    the average pod usage relative to the configured resource requests.
+    """
+    cpu_avg = (cpu_usage / pod_count) if pod_count > 0 else 0
+    mem_avg = (mem_usage / pod_count) if pod_count > 0 else 0
+    return {
+        "service": microservice,
+        "ref": ref,
+        "cpu_util": int((cpu_avg / parse_quantity(DEF_all["req"]["cpu"])) * 100),
+        "cpu_target": cpu_target,
+        "mem_util": int((mem_avg / parse_quantity(DEF_all["req"]["memory"])) * 100),
+        "mem_target": mem_target,
+        "min_pods": min_pods,
+        "max_pods": max_pods,
+        "replicas": replicas,
+        "age": age,
     }
-    
-    for suffix, multiplier in multipliers.items():
-        if quantity.endswith(suffix):
-            return int(quantity[:-len(suffix)]) * multiplier
-            
-    # Plain integer
-    return int(quantity)
 
-import re
+def format_hpa_line(sample):
+    return (f"{sample['service']} {sample['ref']} "
+            f"cpu: {sample['cpu_util']}%/{sample['cpu_target']}% "
+            f"memory: {sample['mem_util']}%/{sample['mem_target']}% "
+            f"{sample['min_pods']} {sample['max_pods']} {sample['replicas']} {sample['age']}")
 
-def get_k8s_metrics(microservice, DEF_all):
+def get_k8s_metrics(microservice, DEF_all, namespace="default"):
     # 1. Get HPA metadata from text output (single call for age, ref, replicas, thresholds)
-    hpa_cmd = f"kubectl get hpa {microservice} --no-headers"
+    hpa_cmd = f"kubectl get hpa {microservice} -n {namespace} --no-headers"
     hpa_res = subprocess.run(hpa_cmd, shell=True, capture_output=True, text=True)
 
     ref, min_pods, max_pods, replicas, age = f"Deployment/{microservice}", -1, -1, 0, "<none>"
@@ -195,7 +227,7 @@ def get_k8s_metrics(microservice, DEF_all):
     else:
         # No HPA (e.g. COLA is managing replicas) — read from deployment spec                                                                                                                           
         dep_res = subprocess.run(
-           f"kubectl get deployment {microservice} -o jsonpath='{{.spec.replicas}}'",
+           f"kubectl get deployment {microservice} -n {namespace} -o jsonpath='{{.spec.replicas}}'",
            shell=True, capture_output=True, text=True
         )
         if dep_res.returncode == 0 and dep_res.stdout.strip():
@@ -203,7 +235,7 @@ def get_k8s_metrics(microservice, DEF_all):
 
 
     # 2. Get actual usage via kubectl top
-    top_cmd = f"kubectl top pods -l run={microservice} --no-headers"
+    top_cmd = f"kubectl top pods -n {namespace} -l run={microservice} --no-headers"
     top_res = subprocess.run(top_cmd, shell=True, capture_output=True, text=True)
 
     cpu_sum, mem_sum, pod_count = 0, 0, 0
@@ -215,92 +247,484 @@ def get_k8s_metrics(microservice, DEF_all):
                 mem_sum += parse_quantity(p_parts[2])
                 pod_count += 1
 
-    cpu_avg = (cpu_sum / pod_count) if pod_count > 0 else 0
-    mem_avg = (mem_sum / pod_count) if pod_count > 0 else 0
-    cpu_util = int((cpu_avg / parse_quantity(DEF_all["req"]["cpu"])) * 100)
-    mem_util = int((mem_avg / parse_quantity(DEF_all["req"]["memory"])) * 100)
+    return build_hpa_sample(microservice, ref, cpu_sum, mem_sum, pod_count, cpu_target, mem_target,
+                            min_pods, max_pods, replicas, age, DEF_all)
+
+def get_hpa_sample_from_snapshot(microservice, snapshot, DEF_all, now=None):
+    """
+    Build the same sample get_k8s_metrics would produce, but from a
+    cluster snapshot instead of per-service kubectl calls.
+    """
+    ref, min_pods, max_pods, replicas, age = f"Deployment/{microservice}", -1, -1, 0, "<none>"
+    cpu_target, mem_target = -1, -1
+
+    hpa = snapshot["hpas"].get(microservice)
+    if hpa is not None:
+        spec, status = hpa.get("spec") or {}, hpa.get("status") or {}
+        target = spec.get("scaleTargetRef") or {}
+        ref = f"{target.get('kind', 'Deployment')}/{target.get('name', microservice)}"
+        min_pods, max_pods = spec.get("minReplicas", 1), spec.get("maxReplicas", -1)
+        replicas = status.get("currentReplicas", 0)
+        for m in spec.get("metrics") or []:
+            resource = m.get("resource") or {}
+            threshold = (resource.get("target") or {}).get("averageUtilization", -1)
+            if resource.get("name") == "cpu":
+                cpu_target = threshold
+            elif resource.get("name") == "memory":
+                mem_target = threshold
+        created = hpa["metadata"].get("creationTimestamp")
+        if created:
+            created_at = datetime.datetime.strptime(created, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=datetime.timezone.utc)
+            age = format_age((now or time.time()) - created_at.timestamp())
+    else:
+        # No HPA (e.g. COLA is managing replicas) — read from deployment spec
+        deployment = snapshot["deployments"].get(microservice)
+        if deployment is not None:
+            replicas = (deployment.get("spec") or {}).get("replicas", 0)
+
+    cpu_sum, mem_sum, pod_count = snapshot["usage"].get(microservice, (0, 0, 0))
+    return build_hpa_sample(microservice, ref, cpu_sum, mem_sum, pod_count, cpu_target, mem_target,
+                            min_pods, max_pods, replicas, age, DEF_all)
 
-    return f"{microservice} {ref} cpu: {cpu_util}%/{cpu_target}% memory: {mem_util}%/{mem_target}% {min_pods} {max_pods} {replicas} {age}"
+def stack_readiness(snapshot, microservices, expect_hpa):
+    """
+    Return the reasons the stack is not ready yet (empty when it is): every
+    Deployment must have finished its rollout with all replicas ready, and
+    the HPA of every Deployment in expect_hpa must report a current metric.
+    """
+    waiting = []
+    for microservice in microservices:
+        deployment = snapshot["deployments"].get(microservice)
+        if deployment is None:
+            waiting.append(f"{microservice}: deployment not found")
+            continue
+        spec, status = deployment.get("spec") or {}, deployment.get("status") or {}
+        desired = spec.get("replicas", 1)
+        if status.get("observedGeneration", 0) < deployment["metadata"].get("generation", 0):
+            waiting.append(f"{microservice}: rollout not observed yet")
+        elif status.get("updatedReplicas", 0) < desired:
+            waiting.append(f"{microservice}: {status.get('updatedReplicas', 0)}/{desired} replicas updated")
+        elif status.get("readyReplicas", 0) < desired:
+            waiting.append(f"{microservice}: {status.get('readyReplicas', 0)}/{desired} pods ready")
+
+        if microservice in expect_hpa:
+            hpa = snapshot["hpas"].get(microservice)
+            current = ((hpa or {}).get("status") or {}).get("currentMetrics") or []
+            if not any(((m.get("resource") or {}).get("current") or {}).get("averageUtilization") is not None
+                       for m in current):
+                waiting.append(f"{microservice}: HPA metrics <unknown>")
+    return waiting
+
+def wait_for_stack_ready(source, microservices, expect_hpa, timeout, poll_interval=5):
+    """
+    Poll until stack_readiness reports nothing left to wait for, or until the
+    timeout expires. Returns True when the stack became ready.
+    """
+    start_time = time.time()
+    while True:
+        waiting = stack_readiness(source.snapshot(), microservices, expect_hpa)
+        elapsed = time.time() - start_time
+        if not waiting:
+            print(f"Stack ready after {elapsed:.0f}s.")
+            return True
+        if elapsed >= timeout:
+            logging.warning(f"Stack not ready after {timeout}s, starting load anyway: {'; '.join(waiting)}")
+            return False
+        logging.info(f"Waiting for stack ({elapsed:.0f}s): {'; '.join(waiting)}")
+        time.sleep(poll_interval)
 
-def record_hpa_numbers(microservice, metric, duration, DEF_all):
+async def wait_for_stack_ready_async(source, microservices, expect_hpa, timeout, poll_interval=5):
     start_time = time.time()
-    duration_in_seconds = interval_string_to_seconds(duration)
-    output_filename = f"{metric}/{microservice}.txt"
+    while True:
+        snapshot = await asyncio.to_thread(source.snapshot)
+        waiting = stack_readiness(snapshot, microservices, expect_hpa)
+        elapsed = time.time() - start_time
+        if not waiting:
+            print(f"Stack ready after {elapsed:.0f}s.")
+            return True
+        if elapsed >= timeout:
+            logging.warning(f"Stack not ready after {timeout}s, starting load anyway: {'; '.join(waiting)}")
+            return False
+        logging.info(f"Waiting for stack ({elapsed:.0f}s): {'; '.join(waiting)}")
+        await asyncio.sleep(poll_interval)
 
+def warm_up(args, source=None):
+    """
+    Wait for the applied stack: a fixed sleep with --warmup-sleep, otherwise
+    until it is actually ready (bounded by --warmup-timeout). A given source
+    is used as is and left open.
+    """
+    if args.warmup_sleep is not None:
+        print(f"Applied app config. Sleeping for {args.warmup_sleep}s while resources provisioned.")
+        time.sleep(args.warmup_sleep)
+        return
+    print(f"Applied app config. Waiting up to {args.warmup_timeout}s for the stack to become ready.")
+    own_source = source is None
+    if own_source:
+        source = create_metrics_source(args.metrics_source, server=args.api_server, namespace=args.namespace,
+                                       replay_file=args.replay_file)
     try:
-        with open(output_filename, "w") as hpa_output_file:
-            # Write labels exactly like HPA output
-            hpa_output_file.write("NAME REFERENCE TARGETS MINPODS MAXPODS REPLICAS AGE\n")
-            while time.time() - start_time < duration_in_seconds:
-                # Use our new function instead of direct subprocess call
-                line = get_k8s_metrics(microservice, DEF_all)
-                
-                if line:
-                    if line.endswith("<none>"):
-                        elapsed = int(time.time() - start_time)
-                        m, s = divmod(elapsed, 60)
-                        computed_age = f"{m}m{s}s" if m else f"{s}s"
-                        line = line[:-len("<none>")] + computed_age
-                    hpa_output_file.write(line)
-                    hpa_output_file.write("\n")
-                    hpa_output_file.flush()
-                     
-                time.sleep(15)
-
-        if os.path.exists(output_filename) and os.stat(output_filename).st_size == 0:
-            os.remove(output_filename)
-            logging.info(f"Removed empty file for {microservice}")
+        wait_for_stack_ready(source, microservices, autoscaled, args.warmup_timeout)
+    finally:
+        if own_source:
+            source.close()
+
+async def warm_up_async(args, source=None):
+    if args.warmup_sleep is not None:
+        print(f"Applied app config. Sleeping for {args.warmup_sleep}s while resources provisioned.")
+        await asyncio.sleep(args.warmup_sleep)
+        return
+    print(f"Applied app config. Waiting up to {args.warmup_timeout}s for the stack to become ready.")
+    own_source = source is None
+    if own_source:
+        source = create_metrics_source(args.metrics_source, server=args.api_server, namespace=args.namespace,
+                                       replay_file=args.replay_file)
+    try:
+        await wait_for_stack_ready_async(source, microservices, autoscaled, args.warmup_timeout)
+    finally:
+        if own_source:
+            source.close()
+
+
+class SampleClock:
+    """
+    Shared monotonic tick source for all samplers. Ticks fire on exact
+    boundaries (start + n * interval), so a slow sample never pushes the
+    following ones later and rows line up across services. A sampler that
+    falls a whole interval behind skips the ticks it missed and counts them
+    instead of sliding.
+    """
+    MIN_INTERVAL = 1
+    MAX_INTERVAL = 60
+
+    def __init__(self, interval, duration):
+        if not self.MIN_INTERVAL <= interval <= self.MAX_INTERVAL:
+            raise ValueError(f"Sampling interval must be between {self.MIN_INTERVAL}s and {self.MAX_INTERVAL}s")
+        self.interval = interval
+        self.n_ticks = math.ceil(interval_string_to_seconds(duration) / interval)
+        self.start_monotonic = time.monotonic()
+        self.start_time = time.time()
+        self.missed = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def scheduled_time(self, tick):
+        return self.start_time + tick * self.interval
+
+    def ticks(self, sampler):
+        """
+        Yield (tick, scheduled, actual) for every tick this sampler reaches,
+        with scheduled and actual as wall-clock timestamps.
+        """
+        tick = 0
+        while tick < self.n_ticks:
+            target = self.start_monotonic + tick * self.interval
+            now = time.monotonic()
+            if now < target:
+                time.sleep(target - now)
+                now = time.monotonic()
+            elif now - target >= self.interval:
+                behind = int((now - target) // self.interval)
+                with self.lock:
+                    self.missed[sampler] += behind
+                tick += behind
+                continue
+            yield tick, self.scheduled_time(tick), self.start_time + (now - self.start_monotonic)
+            tick += 1
+
+    async def aticks(self, sampler):
+        """
+        Async variant of ticks() for samplers running on an event loop.
+        """
+        tick = 0
+        while tick < self.n_ticks:
+            target = self.start_monotonic + tick * self.interval
+            now = time.monotonic()
+            if now < target:
+                await asyncio.sleep(target - now)
+                now = time.monotonic()
+            elif now - target >= self.interval:
+                behind = int((now - target) // self.interval)
+                with self.lock:
+                    self.missed[sampler] += behind
+                tick += behind
+                continue
+            yield tick, self.scheduled_time(tick), self.start_time + (now - self.start_monotonic)
+            tick += 1
+
+    def report(self):
+        for sampler, missed in self.missed.items():
+            logging.warning(f"{sampler} missed {missed}/{self.n_ticks} sampling ticks")
+
+
+class HpaLog:
+    """
+    Per-service HPA text log plus a <service>_times.csv sidecar recording
+    when each line was meant to be and actually was sampled (epoch seconds).
+    Samples are also appended to a shared ColumnarSampleWriter when given.
+    """
+
+    def __init__(self, metric, microservice, columnar=None):
+        self.columnar = columnar
+        self.filename = f"{metric}/{microservice}.txt"
+        self.hpa_output_file = open(self.filename, "w")
+        # Write labels exactly like HPA output
+        self.hpa_output_file.write("NAME REFERENCE TARGETS MINPODS MAXPODS REPLICAS AGE\n")
+        self.times_file = open(f"{metric}/{microservice}_times.csv", "w")
+        self.times_file.write("tick,scheduled,actual\n")
+
+    def write(self, sample, tick, scheduled, actual, elapsed):
+        if sample["age"] == "<none>":
+            sample["age"] = format_age(elapsed)
+        # Times row first: after a crash the times file is at most one row
+        # ahead of the log, never behind it
+        self.times_file.write(f"{tick},{scheduled:.3f},{actual:.3f}\n")
+        self.times_file.flush()
+        self.hpa_output_file.write(format_hpa_line(sample))
+        self.hpa_output_file.write("\n")
+        self.hpa_output_file.flush()
+        if self.columnar is not None:
+            self.columnar.append(sample, scheduled, actual, interval_string_to_seconds(str(sample["age"])))
+
+    def close(self):
+        self.hpa_output_file.close()
+        self.times_file.close()
+
+def record_hpa_numbers(microservice, metric, clock, DEF_all, columnar=None, namespace="default"):
+    hpa_log = None
+    try:
+        hpa_log = HpaLog(metric, microservice, columnar)
+        for tick, scheduled, actual in clock.ticks(microservice):
+            # Use our new function instead of direct subprocess call
+            sample = get_k8s_metrics(microservice, DEF_all, namespace)
+
+            if sample:
+                hpa_log.write(sample, tick, scheduled, actual, scheduled - clock.start_time)
 
         logging.info(f"Completed HPA monitoring for {microservice}")
     except Exception as e:
         logging.error(f"Error monitoring HPA for {microservice}: {str(e)}")
+    finally:
+        if hpa_log is not None:
+            hpa_log.close()
 
+def record_hpa_snapshots(microservices, metric, clock, DEF_all, source, columnar=None):
+    """
+    Batched counterpart of record_hpa_numbers: one thread takes a single
+    cluster snapshot per tick from the given MetricsSource and writes a line
+    to every service's file.
+    """
+    hpa_logs = {}
+    try:
+        for microservice in microservices:
+            hpa_logs[microservice] = HpaLog(metric, microservice, columnar)
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument("-c", "--cpu", default=False, action='store_true')
-    parser.add_argument("-m", "--memory", default=False, action='store_true')
-    parser.add_argument("-r", "--realtime", default=False, action='store_true')
-    parser.add_argument("-t", "--time", default="10m")
+        for tick, scheduled, actual in clock.ticks("snapshot"):
+            snapshot = source.snapshot()
+            for microservice, hpa_log in hpa_logs.items():
+                sample = get_hpa_sample_from_snapshot(microservice, snapshot, DEF_all, scheduled)
+                hpa_log.write(sample, tick, scheduled, actual, scheduled - clock.start_time)
 
-    args = parser.parse_args()
-    DEF_all = create_hpa_yaml(args)
-    
-    # Always force metric to cpu_memory_ for uniform collection
-    metric = "cpu_memory_"
+        logging.info(f"Completed batched HPA monitoring for {len(hpa_logs)} services")
+    except Exception as e:
+        logging.error(f"Error in batched HPA monitoring: {str(e)}")
+    finally:
+        for hpa_log in hpa_logs.values():
+            hpa_log.close()
 
-    if not metric:
-        logging.warning(f"No metrics specified in args.")
-        exit(-1)
+def build_locust_command(args, metric):
+    flags = f"--autostart -u 100 -r 1 -t {args.time} -d {metric}"
+    if args.realtime is True:
+        flags += " --realtime"
+    if args.replay_start:
+        flags += f" --replay-start {args.replay_start}"
+    if args.replay_end:
+        flags += f" --replay-end {args.replay_end}"
+    if args.replay_speedup != 1.0:
+        flags += f" --replay-speedup {args.replay_speedup}"
+    if args.load_workers > 1:
+        flags += f" --processes {args.load_workers}"
+    if args.web_port is not None:
+        flags += f" --web-port {args.web_port}"
+    if args.load_workers > 1 and args.master_port is not None:
+        # The forked workers connect to --master-port, the master binds the other
+        flags += f" --master-bind-port {args.master_port} --master-port {args.master_port}"
+    locustCmd = f"-f {locustfile_path} --host=http://{args.frontend} {flags}"
+    return [locust_venv + "/python", locust_venv + "/locust"] + shlex.split(locustCmd)
 
-    hpaApplyCmd = f"kubectl apply -f {hpa_config_file}"
-    hpaApplyProcess = subprocess.Popen(hpaApplyCmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+# ---------------------------------------------------------------------------
+# asyncio orchestration: samplers, Locust and the HPA apply/delete steps run
+# as tasks on one event loop instead of one OS thread per Deployment.
+# ---------------------------------------------------------------------------
 
-    print("Applied app config. Sleeping for 240s while resources provisioned.")
-    time.sleep(240)
-    print("Running locust workload.")
+async def run_command_async(cmd, timeout):
+    process = await asyncio.create_subprocess_shell(cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        process.kill()
+        await process.wait()
+        raise
+    return process.returncode, stdout.decode(), stderr.decode()
 
-    print("Collecting HPA data.")
-    
-    # Ensure directory exists
-    if not os.path.exists(metric):
-        os.makedirs(metric)
+async def sample_async(name, clock, semaphore, sample_fn, write_fn):
+    """
+    Async sampler loop: waits for each clock tick without holding a thread,
+    then runs the blocking sample_fn in the default executor while holding
+    the concurrency semaphore. A sample that takes longer than one interval
+    is abandoned; the clock counts the ticks it overran. The thread of an
+    abandoned sample cannot be stopped, so it keeps its semaphore slot until
+    it actually returns, and a slow API server cannot pile up calls.
+    """
+    async for tick, scheduled, actual in clock.aticks(name):
+        await semaphore.acquire()
+        sample = asyncio.ensure_future(asyncio.to_thread(sample_fn, scheduled))
+        sample.add_done_callback(lambda _: semaphore.release())
+        try:
+            result = await asyncio.wait_for(asyncio.shield(sample), clock.interval)
+        except asyncio.TimeoutError:
+            logging.warning(f"{name}: sample for tick {tick} timed out")
+            continue
+        write_fn(result, tick, scheduled, actual)
 
-    threads = []
-    for hpa in microservices:
-        thread = threading.Thread(target=record_hpa_numbers, args=(hpa, metric, args.time, DEF_all))
-        # thread.start()
-        threads.append(thread)
+async def run_collector_async(args, DEF_all, metric, max_concurrency, shared_source=None, keep_stack=False):
+    clock = None
+    hpa_logs = {}
+    columnar = ColumnarSampleWriter(f"{metric}/{SAMPLES_FILENAME}") if args.columnar else None
+    source = None
+    samplers = []
+    locustProcess = None
+    try:
+        if not keep_stack:
+            returncode, _, stderr = await run_command_async(f"kubectl apply -f {args.config_file}", timeout=120)
+            if returncode != 0:
+                logging.error(f"Error applying app config: {stderr}")
+
+        await warm_up_async(args, shared_source)
+
+        print("Running locust workload.")
+        logging.info("Applying locust.")
+        command = build_locust_command(args, metric)
+        locustProcess = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE,
+                                                             stderr=asyncio.subprocess.PIPE)
+
+        print("Collecting HPA data.")
+        clock = SampleClock(args.interval, args.time)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        for microservice in microservices:
+            hpa_logs[microservice] = HpaLog(metric, microservice, columnar)
+
+        if args.batched or args.metrics_source != "kubectl":
+            source = shared_source or create_metrics_source(args.metrics_source, server=args.api_server,
+                                                            namespace=args.namespace, replay_file=args.replay_file,
+                                                            record_file=args.record_snapshots)
+
+            def write_snapshot(snapshot, tick, scheduled, actual):
+                for microservice, hpa_log in hpa_logs.items():
+                    sample = get_hpa_sample_from_snapshot(microservice, snapshot, DEF_all, scheduled)
+                    hpa_log.write(sample, tick, scheduled, actual, scheduled - clock.start_time)
+
+            samplers.append(asyncio.create_task(
+                sample_async("snapshot", clock, semaphore, lambda scheduled: source.snapshot(), write_snapshot)))
+        else:
+            for microservice in microservices:
+                hpa_log = hpa_logs[microservice]
+
+                def write_sample(sample, tick, scheduled, actual, hpa_log=hpa_log):
+                    hpa_log.write(sample, tick, scheduled, actual, scheduled - clock.start_time)
+
+                samplers.append(asyncio.create_task(sample_async(
+                    microservice, clock, semaphore,
+                    lambda scheduled, microservice=microservice: get_k8s_metrics(microservice, DEF_all, args.namespace),
+                    write_sample)))
+
+        try:
+            await asyncio.wait_for(locustProcess.communicate(), timeout=interval_string_to_seconds(args.time) + 90)
+        except asyncio.TimeoutError:
+            logging.error("Locust process timed out")
 
+        # Samplers finish on their own at the end of the clock; anything
+        # still running past that (plus one interval of grace) is cancelled
+        remaining = clock.start_time + clock.n_ticks * clock.interval - time.time() + clock.interval
+        done, pending = await asyncio.wait(samplers, timeout=max(remaining, 0))
+        for task in done:
+            if task.exception() is not None:
+                logging.error(f"Sampler failed: {task.exception()}")
+        if pending:
+            logging.warning(f"Cancelling {len(pending)} samplers still running after the run ended")
+    finally:
+        for task in samplers:
+            task.cancel()
+        await asyncio.gather(*samplers, return_exceptions=True)
+        if locustProcess is not None and locustProcess.returncode is None:
+            locustProcess.kill()
+            await locustProcess.wait()
+        for hpa_log in hpa_logs.values():
+            hpa_log.close()
+        if columnar is not None:
+            columnar.close()
+        if source is not None and source is not shared_source:
+            source.close()
+        if clock is not None:
+            clock.report()
+
+        if not keep_stack:
+            logging.info("Deleting app config.")
+            returncode, _, stderr = await run_command_async(f"kubectl delete -f {args.config_file}", timeout=300)
+            if returncode == 0:
+                logging.info("HPA config deleted successfully")
+            else:
+                logging.error(f"Error deleting HPA config: {stderr}")
+
+
+def run_collector(args, DEF_all, metric, shared_source=None, keep_stack=False):
+    """
+    Apply the generated config, wait for the stack, run Locust while the
+    sampler threads record, then delete the config. A shared_source is used
+    for warm-up and batched sampling and left open for the next run. With
+    keep_stack the caller has deployed the stack and it is left running.
+    """
+    if not keep_stack:
+        hpaApplyCmd = f"kubectl apply -f {args.config_file}"
+        hpaApplyProcess = subprocess.Popen(hpaApplyCmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        stdout, stderr = hpaApplyProcess.communicate()
+        if hpaApplyProcess.returncode != 0:
+            logging.error(f"Error applying app config: {stderr}")
+
+    # Everything after the apply runs under the finally that deletes the
+    # config, so a failing constructor cannot leave the stack deployed
+    clock = None
+    columnar = None
+    threads = []
+    source = None
     locustProcess = None
-    flags = f"--autostart -u 100 -r 1 -t {args.time} -d {metric}"
-    if args.realtime is True:
-        flags += " --realtime"
     try:
+        warm_up(args, shared_source)
+        print("Running locust workload.")
+
+        print("Collecting HPA data.")
+
+        # Ensure directory exists
+        if not os.path.exists(metric):
+            os.makedirs(metric)
+
+        columnar = ColumnarSampleWriter(f"{metric}/{SAMPLES_FILENAME}") if args.columnar else None
+        if args.batched or args.metrics_source != "kubectl":
+            source = shared_source or create_metrics_source(args.metrics_source, server=args.api_server,
+                                                            namespace=args.namespace, replay_file=args.replay_file,
+                                                            record_file=args.record_snapshots)
+        clock = SampleClock(args.interval, args.time)
+        if source is not None:
+            threads.append(threading.Thread(target=record_hpa_snapshots,
+                                            args=(microservices, metric, clock, DEF_all, source, columnar)))
+        else:
+            for hpa in microservices:
+                thread = threading.Thread(target=record_hpa_numbers,
+                                          args=(hpa, metric, clock, DEF_all, columnar, args.namespace))
+                # thread.start()
+                threads.append(thread)
 
-        locustCmd = f"-f {locustfile_path} --host=http://{frontend_external_ip} {flags}"
         logging.info("Applying locust.")
-        command = [locust_venv + "/python", locust_venv + "/locust"] + shlex.split(locustCmd)
+        command = build_locust_command(args, metric)
         locustProcess = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
         logging.info("Locust process completed. Sleeping until load builds up.")
         # error_output = locustProcess.stderr.read()
@@ -314,18 +738,302 @@ if __name__ == "__main__":
     finally:
         # Wait for all threads to complete
         for i, thread in enumerate(threads):
+            if thread.ident is None:
+                continue
             logging.info(f"Waiting for thread {i + 1}/{len(threads)} to complete")
             thread.join()
             logging.info(f"Thread {i + 1}/{len(threads)} completed")
+        if clock is not None:
+            clock.report()
+        if columnar is not None:
+            columnar.close()
+        if source is not None and source is not shared_source:
+            source.close()
+
+        if not keep_stack:
+            delete_config(args.config_file)
 
-        logging.info("Deleting app config.")
-        hpaDeleteCmd = f"kubectl delete -f {hpa_config_file}"
-        hpaDeleteProcess = subprocess.Popen(hpaDeleteCmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+def sampling_interval(value):
+    """
+    argparse type for -i/--interval: reject intervals SampleClock would
+    refuse before anything is deployed.
+    """
+    interval = int(value)
+    if not SampleClock.MIN_INTERVAL <= interval <= SampleClock.MAX_INTERVAL:
+        raise argparse.ArgumentTypeError(
+            f"must be between {SampleClock.MIN_INTERVAL} and {SampleClock.MAX_INTERVAL} seconds")
+    return interval
+
+def delete_config(config_file):
+    logging.info("Deleting app config.")
+    hpaDeleteCmd = f"kubectl delete -f {config_file}"
+    hpaDeleteProcess = subprocess.Popen(hpaDeleteCmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    stdout, stderr = hpaDeleteProcess.communicate()
+
+    if hpaDeleteProcess.returncode == 0:
+        logging.info("HPA config deleted successfully")
+    else:
+        logging.error(f"Error deleting HPA config: {stderr}")
 
-        stdout, stderr = hpaDeleteProcess.communicate()
+# Collector options that change what a matrix cell records; part of its input hash
+CELL_OPTIONS = ("interval", "realtime", "replay_start", "replay_end", "replay_speedup", "load_workers", "columnar")
+SWEEP_MANIFEST = "sweep_manifest.json"
 
-        if hpaDeleteProcess.returncode == 0:
-            logging.info("HPA config deleted successfully")
+def run_experiment(args, spec, metric, results_dir, shared_source=None, namespace="default", node_port=None,
+                   collect=True):
+    """
+    Run one matrix cell end to end: generate its config, collect into
+    <results_dir>/<spec.name>/<metric>, then build its dataset next to it.
+    The raw logs stay where they were collected, so an interrupted cell
+    keeps everything recorded so far. With collect=False only the dataset
+    is built, from whatever raw logs are already there.
+    Outside the default namespace the cell gets its own config file and
+    WebUI node_port, so cells can run side by side. With --incremental the
+    live stack is patched to the cell's config instead of being deployed
+    from scratch, and left running for the next cell.
+    Returns the hash of the dataset inputs, or None if building it failed.
+    """
+    output_dir = os.path.join(results_dir, spec.name)
+    metric = os.path.join(output_dir, metric)
+    os.makedirs(metric, exist_ok=True)
+    with open(os.path.join(output_dir, "experiment.yaml"), "w") as f:
+        yaml.dump(spec.to_dict(), f, default_flow_style=False, sort_keys=False)
+
+    if collect:
+        # The per-run code reads these from args
+        cell_args = argparse.Namespace(**vars(args))
+        cell_args.time = spec.duration
+        cell_args.cpu = "cpu" in spec.metric_names()
+        cell_args.memory = "memory" in spec.metric_names()
+        cell_args.namespace = namespace
+        cell_args.config_file = config_file_for(namespace)
+        if node_port is not None:
+            cell_args.frontend = frontend_for(args.frontend, node_port)
+
+        DEF_all = create_hpa_yaml(spec, namespace, node_port, cell_args.config_file)
+        if args.incremental:
+            changed = apply_incremental(cell_args.config_file, namespace)
+            print(f"Patched {changed} objects of the live stack.")
+        if args.use_asyncio:
+            asyncio.run(run_collector_async(cell_args, DEF_all, metric, args.max_concurrency, shared_source,
+                                            keep_stack=args.incremental))
         else:
-            logging.error(f"Error deleting HPA config: {stderr}")
+            run_collector(cell_args, DEF_all, metric, shared_source, keep_stack=args.incremental)
+
+    try:
+        # Imported here so plain collection runs do not need pandas
+        import data_process
+        options = dict(time=spec.duration, realtime=args.realtime, columnar=args.columnar, interval=args.interval)
+        data_process.build_dataset_cached(metric, **options)
+        shutil.copy(data_process.dataset_path(metric, spec.duration), output_dir)
+        return data_process.input_hash(metric, **options)
+    except Exception as e:
+        logging.error(f"{spec.name}: building the dataset failed: {e}")
+        return None
+
+def run_isolated_experiment(args, spec, metric, namespace, node_port, web_port, master_port, collect=True):
+    """
+    Worker entry point for parallel matrix runs: one cell in its own
+    namespace, with its own metrics source and Locust web and master ports.
+    """
+    args = argparse.Namespace(**vars(args))
+    args.web_port = web_port
+    args.master_port = master_port
+    # Every cell has a namespace of its own, so there is no stack to carry over
+    args.incremental = False
+    print(f"=== Experiment {spec.name} starting in namespace {namespace} (WebUI port {node_port}) ===")
+    return run_experiment(args, spec, metric, args.results_dir, namespace=namespace, node_port=node_port,
+                          collect=collect)
+
+def plan_matrix(args, specs, metric, manifest):
+    """
+    Decide per cell what a (re)started sweep does: skip it when the manifest
+    has it complete with the same inputs, and otherwise collect it. Raw logs
+    left by an interrupted, failed or outdated run are moved aside rather
+    than overwritten, unless --resume-partial builds the interrupted or
+    failed cell's dataset from them instead of collecting again.
+    Returns [(spec, inputs, collect)] for the cells still to run.
+    """
+    options = {name: getattr(args, name) for name in CELL_OPTIONS}
+    plan = []
+    for spec in specs:
+        inputs = cell_hash(spec, **options)
+        if manifest.is_complete(spec.name, inputs):
+            print(f"=== Experiment {spec.name} already complete, skipping ===")
+            continue
+        raw_dir = os.path.join(args.results_dir, spec.name, metric)
+        if os.path.isdir(raw_dir) and os.listdir(raw_dir):
+            reason = {"complete": "outdated", "failed": "failed"}.get(manifest.status(spec.name), "partial")
+            if args.resume_partial and reason != "outdated":
+                print(f"=== Experiment {spec.name} did not finish, building its dataset from the {reason} logs ===")
+                plan.append((spec, inputs, False))
+                continue
+            set_aside = f"{raw_dir}.{reason}-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+            os.replace(raw_dir, set_aside)
+            logging.warning(f"{spec.name}: kept the {reason} raw logs of the previous run in {set_aside}")
+        plan.append((spec, inputs, True))
+    return plan
+
+def run_matrix(args, metric):
+    """
+    Run every cell of the --matrix file. Sequential runs share one process,
+    the parsed manifests and one metrics source (and its connection) across
+    cells. With --parallel N, up to N cells run at once, each in its own
+    namespace with its own WebUI NodePort. Sequential --incremental runs
+    carry the stack from cell to cell and delete it once at the end.
+
+    Completed cells are checkpointed in <results_dir>/sweep_manifest.json,
+    so rerunning the same command after a crash continues where it stopped.
+    """
+    specs = load_matrix(args.matrix)
+    os.makedirs(args.results_dir, exist_ok=True)
+    manifest = SweepManifest(os.path.join(args.results_dir, SWEEP_MANIFEST))
+    plan = plan_matrix(args, specs, metric, manifest)
+
+    def complete(spec, inputs, collect, dataset):
+        # Without a dataset the cell is not done: record it so a restart retries it
+        if dataset is None:
+            manifest.mark_failed(spec.name, inputs, "building the dataset failed")
+            raise RuntimeError("building the dataset failed")
+        manifest.mark_complete(spec.name, inputs, dataset=dataset, partial=not collect)
+        print(f"=== Experiment {spec.name} complete ===")
+
+    if args.parallel > 1:
+        namespaces = [namespace_for(spec.name) for spec in specs]
+        if len(set(namespaces)) != len(namespaces):
+            raise ValueError(f"{args.matrix}: experiment names do not map to distinct namespaces")
+        if args.incremental:
+            logging.warning("--incremental has no effect with --parallel: every experiment gets a fresh namespace")
+        ports = {spec.name: i for i, spec in enumerate(specs)}
+        failed = []
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.parallel) as executor:
+            futures = {executor.submit(run_isolated_experiment, args, spec, metric, namespace_for(spec.name),
+                                       args.node_port_base + ports[spec.name],
+                                       LOCUST_WEB_PORT + 1 + ports[spec.name],
+                                       LOCUST_MASTER_PORT + 1 + ports[spec.name], collect): (spec, inputs, collect)
+                       for spec, inputs, collect in plan}
+            for future in concurrent.futures.as_completed(futures):
+                spec, inputs, collect = futures[future]
+                try:
+                    complete(spec, inputs, collect, future.result())
+                except Exception as e:
+                    logging.error(f"Experiment {spec.name} failed: {e}")
+                    if manifest.status(spec.name) != "failed":
+                        manifest.mark_failed(spec.name, inputs, e)
+                    failed.append(spec.name)
+        if failed:
+            logging.error(f"{len(failed)} of {len(plan)} experiments failed: {failed}")
+        return
+
+    failed = []
+    source = create_metrics_source(args.metrics_source, server=args.api_server, namespace=args.namespace,
+                                   replay_file=args.replay_file, record_file=args.record_snapshots)
+    try:
+        for i, (spec, inputs, collect) in enumerate(plan):
+            print(f"=== Experiment {i + 1}/{len(plan)}: {spec.name} ({spec.duration}) ===")
+            dataset = run_experiment(args, spec, metric, args.results_dir, source, args.namespace, args.node_port,
+                                     collect)
+            try:
+                complete(spec, inputs, collect, dataset)
+            except RuntimeError as e:
+                logging.error(f"Experiment {spec.name} failed: {e}")
+                failed.append(spec.name)
+        if failed:
+            logging.error(f"{len(failed)} of {len(plan)} experiments failed: {failed}")
+    finally:
+        source.close()
+        if args.incremental and any(collect for _, _, collect in plan):
+            delete_config(config_file_for(args.namespace))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-c", "--cpu", default=False, action='store_true')
+    parser.add_argument("-m", "--memory", default=False, action='store_true')
+    parser.add_argument("-r", "--realtime", default=False, action='store_true')
+    parser.add_argument("-t", "--time", default="10m")
+    parser.add_argument("-i", "--interval", default=15, type=sampling_interval,
+                        help=f"Sampling interval in seconds ({SampleClock.MIN_INTERVAL}-{SampleClock.MAX_INTERVAL})")
+    parser.add_argument("-b", "--batched", default=False, action='store_true',
+                        help="Take one cluster snapshot per tick instead of polling kubectl per service")
+    parser.add_argument("-s", "--metrics-source", default="kubectl", choices=["kubectl", "api", "fake"],
+                        help="Snapshot backend for batched collection (api/fake imply --batched)")
+    parser.add_argument("--api-server", default=None,
+                        help="API server URL for the api source (default: in-cluster or kubectl proxy)")
+    parser.add_argument("--replay-file", default=None,
+                        help="Recorded snapshots (JSON lines) replayed by the fake source")
+    parser.add_argument("--record-snapshots", default=None,
+                        help="Append every snapshot as JSON lines to this file")
+    parser.add_argument("-a", "--asyncio", dest="use_asyncio", default=False, action='store_true',
+                        help="Run samplers, Locust and kubectl steps as tasks on one event loop")
+    parser.add_argument("--max-concurrency", default=8, type=int,
+                        help="Maximum number of in-flight samples in asyncio mode")
+    parser.add_argument("--warmup-timeout", default=600, type=int,
+                        help="Seconds to wait for rollouts, pod readiness and HPA metrics before starting load")
+    parser.add_argument("--warmup-sleep", default=None, type=int,
+                        help="Sleep a fixed number of seconds after apply instead of waiting for readiness")
+    parser.add_argument("--replay-start", default=None,
+                        help="Trace offset the load generator starts replaying from, e.g. 6h")
+    parser.add_argument("--replay-end", default=None,
+                        help="Trace offset the load generator stops replaying at, e.g. 8h")
+    parser.add_argument("--replay-speedup", default=1.0, type=float,
+                        help="Replay the trace this many times faster (rates scale up by the same factor)")
+    parser.add_argument("--load-workers", default=1, type=int,
+                        help="Run Locust as a master with this many local worker processes sharing the replay")
+    parser.add_argument("--threshold", default=90, type=int,
+                        help="HPA target utilization (percent) for the -c/-m metrics")
+    parser.add_argument("--matrix", default=None,
+                        help="Run every experiment of this YAML/JSON matrix file (see experiment_matrix.yaml)")
+    parser.add_argument("--results-dir", default="experiment_results",
+                        help="Where --matrix runs store each experiment's dataset and raw logs")
+    parser.add_argument("--resume-partial", default=False, action='store_true',
+                        help="Build datasets of interrupted --matrix experiments from their partial logs "
+                             "instead of collecting them again")
+    parser.add_argument("--incremental", default=False, action='store_true',
+                        help="Between sequential --matrix experiments, patch only what changed in the live stack "
+                             "and reset replicas instead of redeploying it")
+    parser.add_argument("--namespace", default="default",
+                        help="Kubernetes namespace the stack is deployed to and sampled from")
+    parser.add_argument("--frontend", default=frontend_external_ip,
+                        help="host:port/ of the TeaStore WebUI that Locust targets")
+    parser.add_argument("--node-port", default=None, type=int,
+                        help="Expose the WebUI on this NodePort instead of the manifest's (also sets --frontend's port)")
+    parser.add_argument("--web-port", default=None, type=int,
+                        help=f"Locust web UI port (Locust's default is {LOCUST_WEB_PORT})")
+    parser.add_argument("--master-port", default=None, type=int,
+                        help=f"Port the Locust master binds with --load-workers > 1 (Locust's default is {LOCUST_MASTER_PORT})")
+    parser.add_argument("--parallel", default=1, type=int,
+                        help="Run up to this many --matrix experiments at once, each in its own namespace")
+    parser.add_argument("--node-port-base", default=30100, type=int,
+                        help="WebUI NodePort of the first parallel experiment; later ones count up from it")
+    parser.add_argument("--columnar", default=False, action='store_true',
+                        help=f"Also write typed samples to <metric>/{SAMPLES_FILENAME} (Arrow IPC stream)")
+
+    args = parser.parse_args()
+
+    # Always force metric to cpu_memory_ for uniform collection
+    metric = "cpu_memory_"
+
+    if not metric:
+        logging.warning(f"No metrics specified in args.")
+        exit(-1)
+
+    if args.matrix:
+        run_matrix(args, metric)
+        sys.exit(0)
+
+    args.config_file = config_file_for(args.namespace)
+    if args.node_port is not None:
+        args.frontend = frontend_for(args.frontend, args.node_port)
+    DEF_all = create_hpa_yaml(spec_from_args(args), args.namespace, args.node_port, args.config_file)
+
+    if args.use_asyncio:
+        os.makedirs(metric, exist_ok=True)
+        try:
+            asyncio.run(run_collector_async(args, DEF_all, metric, args.max_concurrency))
+        except KeyboardInterrupt:
+            logging.warning("Interrupted; samplers and Locust cancelled.")
+        sys.exit(0)
 
+    run_collector(args, DEF_all, metric)
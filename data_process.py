@@ -3,103 +3,192 @@
 
 # In[163]:
 
-from collections import defaultdict
-from functools import reduce
-from utils import interval_string_to_seconds, parse_hpa_output
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from rps_log import RPS_FIELDS, RPS_FILENAME, RT_RPS_FILENAME
+from sample_store import SAMPLES_FILENAME, read_samples
+from utils import format_age
 
 import argparse
 import glob
+import hashlib
+import json
+import numpy as np
 import pandas as pd
-import re
 import os
-
-# In[164]:
-
-parser = argparse.ArgumentParser()
-parser.add_argument("-t", "--time", default="10m")
-parser.add_argument("-r", "--realtime", action='store_true')
-parser.add_argument("-v", "--version", default="new")
-
-args = parser.parse_args()
+import sys
 
 metric_folders = ["cpu_memory_"]
-dfs = {folder: [] for folder in metric_folders}
 
-print(f"Reading all metric folders in {os.getcwd()}")
-for metric_folder_name in metric_folders:
-    for filename in glob.glob(f"{metric_folder_name}/*.txt"):
+def columnar_service_dfs(samples):
+    """
+    Build the same per-service frames as the text parser from typed samples.
+    """
+    service_dfs = []
+    for service_name, service_samples in samples.groupby("service", sort=False):
+        service_samples = service_samples.sort_values("timestamp")
+        times = service_samples["age_seconds"].map(format_age)
+        df = pd.DataFrame({
+            f"cpu_{service_name}": service_samples["cpu_util"],
+            f"cpu_{service_name}_scaling_threshold": service_samples["cpu_target"].fillna(-1).astype(int),
+            f"memory_{service_name}": service_samples["mem_util"],
+            f"memory_{service_name}_scaling_threshold": service_samples["mem_target"].fillna(-1).astype(int),
+            f"replicas_{service_name}": service_samples["replicas"],
+            'time': times,
+            'timestamp': service_samples["timestamp"],
+        }).reset_index(drop=True)
+        service_dfs.append(df)
+    return service_dfs
+
+
+# Every "kubectl get hpa"-style line ends in MINPODS MAXPODS REPLICAS AGE
+HPA_TAIL_PATTERN = r'(?P<min_pods>\S+)\s+(?P<max_pods>\S+)\s+(?P<replicas>\S+)\s+(?P<time>\S+)$'
+# "new" layout targets: "cpu: 37%/90%" or "memory: <unknown>/90%"
+NAMED_TARGET_PATTERN = r'(?P<name>\w+):\s+(?:(?P<value>-?\d+)%|<unknown>)/(?P<threshold>-?\d+)%'
+# "old" layout targets: positional "37%/90%" tokens
+TARGET_PATTERN = r'(?:(?P<value>-?\d+)%|<unknown>)/(?P<threshold>-?\d+)%'
+
+def parse_hpa_lines(lines, metric_names, version):
+    """
+    Vectorized equivalent of parse_hpa_output over a Series of raw log lines.
+
+    Returns a DataFrame indexed like lines with one value and one threshold
+    column per entry of metric_names (e.g. "cpu_"), plus "replicas" and
+    "time". Values that are missing or <unknown> come out as NaN, matching
+    the None values of the line-by-line parser.
+    """
+    lines = lines.str.strip()
+    tail = lines.str.extract(HPA_TAIL_PATTERN)
+
+    if version == "new":
+        targets = lines.str.extractall(NAMED_TARGET_PATTERN)
+        targets["metric"] = targets["name"] + "_"
+    else:
+        targets = lines.str.extractall(TARGET_PATTERN)
+        match_number = targets.index.get_level_values("match")
+        targets["metric"] = [metric_names[i] if i < len(metric_names) else None for i in match_number]
+        # A single TARGETS column (7 tokens) is not attributed to any metric
+        n_parts = lines.str.count(r'\s+') + 1
+        targets = targets[(n_parts != 7).reindex(targets.index, level=0).to_numpy()]
+
+    targets = targets.droplevel("match").set_index("metric", append=True)
+    targets = targets[~targets.index.duplicated(keep="first")]
+    values = targets["value"].unstack("metric")
+    thresholds = targets["threshold"].unstack("metric")
+
+    parsed = pd.DataFrame(index=lines.index)
+    for metric in metric_names:
+        column = values[metric] if metric in values.columns else None
+        parsed[metric] = pd.to_numeric(column.reindex(lines.index)) if column is not None else None
+        column = thresholds[metric] if metric in thresholds.columns else None
+        parsed[metric + "threshold"] = pd.to_numeric(column.reindex(lines.index)) if column is not None else None
+    parsed["replicas"] = pd.to_numeric(tail["replicas"])
+    parsed["time"] = tail["time"]
+    return parsed
+
+def read_hpa_log(filename, metric_names, version, chunksize=100000):
+    """
+    Parse one collector .txt log in chunks, so memory stays bounded by the
+    typed columns rather than by Python objects per line.
+    """
+    reader = pd.read_csv(filename, sep="\x01", header=None, names=["line"], skiprows=1, dtype=str,
+                         quoting=3, skip_blank_lines=True, chunksize=chunksize)
+    chunks = [parse_hpa_lines(chunk["line"], metric_names, version) for chunk in reader]
+    if not chunks:
+        return parse_hpa_lines(pd.Series([], dtype=str), metric_names, version)
+    return pd.concat(chunks, ignore_index=True)
+
+def read_rps_log(filename):
+    """
+    Parse an rps.txt-style log ("<key>: <value>;" pairs, one row per line)
+    into a float DataFrame with one column per key.
+    """
+    lines = pd.read_csv(filename, sep="\x01", header=None, names=["line"], dtype=str,
+                        quoting=3, skip_blank_lines=True)["line"]
+    pairs = lines.str.extractall(r'(?P<key>[^;:\s][^;:]*):\s*(?P<value>[^;]+)')
+    pairs["key"] = pairs["key"].str.strip()
+    pairs = pairs.droplevel("match").set_index("key", append=True)
+    pairs = pairs[~pairs.index.duplicated(keep="last")]
+    df = pd.to_numeric(pairs["value"].str.strip()).unstack("key")
+    keys = list(dict.fromkeys(pairs.index.get_level_values("key")))
+    return df.reindex(columns=keys).reset_index(drop=True)
+
+def text_service_df(filename, metric_folder_name, version):
+    """
+    Parse one service's text log into the per-service frame used for merging.
+    metric_folder_name is the metric prefix (e.g. "cpu_memory_"), not a path.
+    """
+    service_name = os.path.basename(filename).split('.')[0]
+    metric_names = [name + "_" for name in filter(None, metric_folder_name.split("_"))]
+    parsed = read_hpa_log(filename, metric_names, version)
+    # Scheduled sample times written next to the log by the collector, one row per line
+    times_filename = os.path.join(os.path.dirname(filename), f"{service_name}_times.csv")
+    if os.path.exists(times_filename):
+        scheduled = pd.read_csv(times_filename)["scheduled"]
+        # The collector writes the times row before its log line, so a run
+        # killed in between leaves one extra row
+        if len(scheduled) in (len(parsed), len(parsed) + 1):
+            parsed["timestamp"] = scheduled.iloc[:len(parsed)].to_numpy()
+    # Legacy logs carry no tick times; drop their first row by HPA age as before
+    elif len(parsed) > 0 and str(parsed["time"].iloc[0]).startswith('5'):
+        parsed = parsed.iloc[1:].reset_index(drop=True)
+
+    columns = {}
+    for metric in metric_names:
+        columns[metric + service_name] = parsed[metric]
+        columns[metric + service_name + "_scaling_threshold"] = parsed[metric + "threshold"]
+    columns[f"replicas_{service_name}"] = parsed["replicas"]
+    columns['time'] = parsed["time"]
+    if "timestamp" in parsed.columns:
+        columns['timestamp'] = parsed["timestamp"]
+    return pd.DataFrame(columns)
+
+
+def load_hpa_logs(directory, version="new", columnar=False):
+    """
+    Load every service log in a collector output directory (e.g.
+    "cpu_memory_") as a list of per-service frames.
+    """
+    metric_folder_name = os.path.basename(os.path.normpath(directory))
+    samples_path = os.path.join(directory, SAMPLES_FILENAME)
+    if columnar and os.path.exists(samples_path):
+        return columnar_service_dfs(read_samples(samples_path))
+
+    service_dfs = []
+    for filename in sorted(glob.glob(os.path.join(directory, "*.txt"))):
         if not filename.endswith("rps.txt"):
-            service_name = filename.split('/')[1].split('.')[0]
-            with open(filename, 'r') as file:
-                lines = file.readlines()
-                metric_values = []
-                multiple_metric_values = defaultdict(list)
-                thresholds = defaultdict(list)
-                replicas = []
-                times = []
-
-                multiple_metrics = metric_folder_name.count('_') > 1
-                if multiple_metrics is True:
-                    metric_names = [name + "_" for name in filter(None, metric_folder_name.split("_"))]
-                n_metrics = len(metric_names)
-                # Parse each line
-                for index, line in enumerate(lines[1:]):  # Skip the header line
-                    parts = line.split()
-                    if index == 0 and parts[len(parts) - 1].startswith('5'):
-                        continue
-                    metric_value, multiple_metric_value, threshold, replica, timestamp = parse_hpa_output(parts, metric_names.copy(), args.version)
-                    multiple_metric_value = {key + "_": value for key, value in multiple_metric_value.items()}
-
-                    for i, metric in enumerate(multiple_metric_value.keys()):
-                        thresholds[metric].append(threshold[i])
-                        multiple_metric_values[metric].append(multiple_metric_value[metric][0])
-
-                    metric_values += metric_value
-                    # thresholds += threshold
-                    replicas.append(replica)
-                    times.append(timestamp)
-                if multiple_metrics is True:
-                    metric_keys = []
-                    for metric_number in range(n_metrics):
-                        metric_keys.append(metric_names[metric_number] + service_name)
-
-                    # if a service drops a scaling metric during runtime:
-                    # max_key = max(thresholds, key=lambda k: len(thresholds[k]))
-                    # max_length = len(thresholds[max_key])
-                    max_length = len(replicas)
-                    for threshold_key in thresholds.keys():
-                        current_length = len(thresholds[threshold_key])
-                        if current_length < max_length:
-                            thresholds[threshold_key] += [None] * (max_length - current_length)
-                            multiple_metric_values[threshold_key] += [None] * (max_length - current_length)
-
-                    # if a service has only one scaling metric:
-                    for metric_key in metric_keys:
-                        metric = metric_key.split(service_name)[0]
-                        if metric not in thresholds.keys():
-                            thresholds[metric] = [None] * max_length
-                            multiple_metric_values[metric] = [None] * max_length
-
-                    metric_dict = {}
-                    for index, key in enumerate(metric_keys):
-                        metric_dict[key] = multiple_metric_values[metric_names[index]]
-                        metric_dict[metric_names[index] + service_name + "_scaling_threshold"] = thresholds[metric_names[index]]
-
-                    updated_dict = dict(metric_dict, **{f"replicas_{service_name}": replicas, 'time': times})
-                    df = pd.DataFrame(updated_dict)
-                else:
-                    df = pd.DataFrame({
-                        f"{metric_folder_name + service_name}": metric_values,
-                        f"replicas_{service_name}": replicas,
-                        'time': times
-                    })
-
-                    # Add the scaling threshold column
-                    df[f"{metric_folder_name + service_name}_scaling_threshold"] = thresholds[0]
-                # Display the DataFrame
-                dfs[metric_folder_name].append(df)
-
-print("Read successful.")
+            service_dfs.append(text_service_df(filename, metric_folder_name, version))
+    return service_dfs
+
+
+RPS_DTYPES = {"name": str, "method": str, "count": "int64"}
+
+def read_rps_csv(filename):
+    """
+    Read an rps.csv log (one row per endpoint per interval) into the wide
+    layout of read_rps_log: one row per interval with the same
+    "('<name>', '<method>')_<field>" columns, plus the interval's "timestamp"
+    (its end) and "window_seconds" (its length).
+    """
+    rows = pd.read_csv(filename, dtype=RPS_DTYPES)
+    rows["endpoint"] = "('" + rows["name"] + "', '" + rows["method"] + "')"
+    fields = [f for f in RPS_FIELDS if f not in ("timestamp", "window_seconds", "name", "method")]
+    wide = rows.pivot_table(index="timestamp", columns="endpoint", values=fields, aggfunc="last", sort=False)
+    endpoints = list(dict.fromkeys(rows["endpoint"]))
+    columns = [(field, endpoint) for endpoint in endpoints for field in fields if (field, endpoint) in wide.columns]
+    wide = wide[columns].sort_index()
+    wide.columns = [f"{endpoint}_{field}" for field, endpoint in columns]
+    wide["window_seconds"] = rows.groupby("timestamp")["window_seconds"].max()
+    return wide.reset_index()
+
+def load_rps(directory, realtime=False):
+    """
+    Load the Locust RPS log of a collector output directory, preferring the
+    timestamped rps.csv over the older rps.txt.
+    """
+    filename = os.path.join(directory, RT_RPS_FILENAME if realtime else RPS_FILENAME)
+    if os.path.exists(filename):
+        return read_rps_csv(filename)
+    return read_rps_log(os.path.join(directory, "rt_rps.txt" if realtime else "rps.txt"))
 
 
 def generate_time_strings(start, end):
@@ -248,8 +337,6 @@ def increment_time_by_15s(time_string):
 #
 #     return f"{new_minutes}m{new_seconds}s"
 #
-# expected_timestamps = generate_time_strings(60, interval_string_to_seconds(args.time))
-#
 # print("Rounding timestamps to nearest 15s interval. Round down for upto 5s difference; else round up.")
 # # round timestamps to nearest 15s timestamp
 # for key in dfs.keys():
@@ -304,56 +391,228 @@ def increment_time_by_15s(time_string):
 #
 #         dfs[key][df_index] = new_df.reset_index(drop=True)
 
-rps = {folder: [] for folder in metric_folders}
-
-print("Reading RPS files.")
-for metric_folder_name in metric_folders:
-    if args.realtime is True:
-        filename = "rt_rps.txt"
+def align_service_dfs(service_dfs, interval=None, tolerance=None):
+    """
+    Join per-service frames on time instead of row position.
+
+    When every frame has the scheduled epoch "timestamp" (collector sidecars
+    or columnar samples), a common tick grid is laid over the span all
+    services cover; each service is matched to the nearest sample within
+    tolerance (default half an interval) and ticks with no sample (dropped
+    samples) are forward-filled with the last HPA values. The interval
+    defaults to the finest median spacing of any service, so one service
+    with dropped samples does not coarsen the grid. The "time" column
+    is each grid tick's offset from the cell's first scheduled tick, so it
+    does not depend on when the HPAs were created (with --incremental they
+    outlive the cell).
+
+    Logs without timestamps are joined by row position, as before: their
+    kubectl ages are too coarse (minutes after 10m, hours later on) to key on.
+    """
+    if not all("timestamp" in df.columns for df in service_dfs):
+        frames = [df.drop(columns="timestamp", errors="ignore").reset_index(drop=True) for df in service_dfs]
+        frames = [df.drop(columns="time") if i < len(frames) - 1 else df for i, df in enumerate(frames)]
+        return pd.concat(frames, axis=1, join="inner") if frames else pd.DataFrame()
+
+    key = "timestamp"
+    frames = []
+    for df in service_dfs:
+        df = df.dropna(subset=[key]).sort_values(key, kind="stable").drop_duplicates(key, keep="last")
+        if len(df) > 0:
+            frames.append(df)
+    if not frames:
+        return pd.DataFrame()
+
+    if interval is None:
+        spacing = pd.Series([df[key].diff().median() for df in frames]).min()
+        interval = spacing if pd.notna(spacing) and spacing > 0 else 15
+    if tolerance is None:
+        tolerance = interval / 2
+
+    first_tick = min(df[key].iloc[0] for df in frames)
+    start = max(df[key].iloc[0] for df in frames)
+    end = min(df[key].iloc[-1] for df in frames)
+    grid = pd.DataFrame({key: np.arange(start, end + interval / 2, interval, dtype=float)})
+
+    aligned = [grid]
+    for df in frames:
+        df = df.drop(columns="time").astype({key: float}).assign(_matched=True)
+        nearest = pd.merge_asof(grid, df, on=key, direction="nearest", tolerance=tolerance)
+        # Ticks this service has no sample for keep its last known values
+        previous = pd.merge_asof(grid, df, on=key, direction="backward")
+        missing = nearest["_matched"].isna()
+        nearest.loc[missing] = previous.loc[missing]
+        aligned.append(nearest.drop(columns=[key, "_matched"]))
+
+    aligned.append(pd.DataFrame({"time": [format_age(offset) for offset in grid[key] - first_tick]}))
+
+    return pd.concat(aligned, axis=1)
+
+
+def build_dataset(directory, time="10m", realtime=False, version="new", columnar=False, write=True,
+                  interval=None, tolerance=None):
+    """
+    Align all service logs of one collector output directory on time, add the
+    RPS log and return the dataset. With write=True it is also saved as
+    <directory>/<metric><test|train>.csv, as the CLI always did.
+    """
+    print(f"Reading {directory}")
+    service_dfs = load_hpa_logs(directory, version, columnar)
+    rps_df = load_rps(directory, realtime)
+
+    print("Aligning dataframes for all microservices on time.")
+    combined = align_service_dfs(service_dfs, interval, tolerance)
+
+    print("Merging HPA and RPS dataframes.")
+    if "timestamp" in combined.columns and "timestamp" in rps_df.columns:
+        # Each HPA tick gets the RPS window that contains it: the first one
+        # ending at or after the tick, unless that one started after the tick.
+        # This holds for any HPA interval, since RPS windows have their own length.
+        rps_df = rps_df.astype({"timestamp": float}).assign(_window_end=lambda df: df["timestamp"])
+        dataset = pd.merge_asof(combined, rps_df, on="timestamp", direction="forward",
+                                tolerance=float(rps_df["window_seconds"].max()))
+        outside = dataset["_window_end"] - dataset["timestamp"] > dataset["window_seconds"]
+        dataset.loc[outside, rps_df.columns.drop(["timestamp", "window_seconds", "_window_end"])] = np.nan
+        dataset = dataset.drop(columns=["_window_end", "window_seconds"])
     else:
-        filename = "rps.txt"
-    with open(metric_folder_name + f"/{filename}", 'r') as file:
-        lines = file.readlines() # [:41]
-        for line in lines:
-            cols = list(filter(lambda x: ":" in x, line.split(";")))
-            keys = list(map(lambda x: x.split(":")[0], cols))
-            vals = list(map(float, map(lambda x: x.split(":")[1], cols)))
-            row_data = dict(zip(keys, vals))
-            rps[metric_folder_name].append(row_data)
-print("RPS files read successfully.")
-
-rps_dfs = {r: pd.DataFrame(rps[r]) for r in rps.keys()}
-
-print("Merging dataframes for all microservices into one dataframe.")
-# merge dataframes for all microservices into one dataframe
-print(rps_dfs["cpu_memory_"])
-print(dfs["cpu_memory_"][0])
-# merge_dfs = lambda dfs_list: reduce(lambda left, right: pd.merge(left, right, on='time', how='outer'), dfs_list)
-merge_dfs = lambda dfs_list: reduce(lambda left, right: pd.merge(
-    left.drop('time', axis=1), right, left_index=True, right_index=True, how='inner'), dfs_list)
-print("Dataframe merge successful.")
-
-def custom_sort_key(x):
-    try:
-        return pd.Timedelta(x).total_seconds()
-    except:
-        return float(x)
-
-combined_microservices_dataframes = {}
-
-print("Merging HPA and RPS dataframes.")
-for metric_folder_name in metric_folders:
-    combined_microservices_dataframes[metric_folder_name] = merge_dfs(dfs[metric_folder_name]) # timestamps are lexicographically sorted
-    combined_microservices_dataframes[metric_folder_name] = combined_microservices_dataframes[metric_folder_name].sort_values('time', key=lambda x: x.map(custom_sort_key))
-    combined_microservices_dataframes[metric_folder_name] = combined_microservices_dataframes[metric_folder_name].reset_index(drop=True)
-print("HPA and RPS merge successful.")
-
-datasets = {}
-
-dataset_type = "test" if args.time == "10m" else "train"
-
-print("Writing datasets to disk.")
-for metric_folder_name in metric_folders:
-    datasets[metric_folder_name] = pd.concat([combined_microservices_dataframes[metric_folder_name], rps_dfs[metric_folder_name]], axis=1)
-    datasets[metric_folder_name].to_csv(f"{metric_folder_name}/{metric_folder_name}{dataset_type}.csv", index=False)
-print("Datasets written successfully.")
+        # Old logs without timestamps can only be joined by row position
+        dataset = pd.concat([combined, rps_df.drop(columns=["timestamp", "window_seconds"], errors="ignore")], axis=1)
+    dataset = dataset.drop(columns=["timestamp", "offset"], errors="ignore")
+
+    if write:
+        dataset.to_csv(dataset_path(directory, time), index=False)
+        print("Dataset written successfully.")
+    return dataset
+
+
+def dataset_path(directory, time="10m"):
+    metric_folder_name = os.path.basename(os.path.normpath(directory))
+    dataset_type = "test" if time == "10m" else "train"
+    return os.path.join(directory, f"{metric_folder_name}{dataset_type}.csv")
+
+
+# The processing code is an input too: a parser fix invalidates cached datasets
+CODE_FILES = [os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+              for name in ("data_process.py", "utils.py", "sample_store.py", "rps_log.py")]
+
+def input_hash(directory, **options):
+    """
+    Content hash of everything a dataset is derived from: the raw collector
+    logs in directory, the processing code and the processing options.
+    """
+    inputs = glob.glob(os.path.join(directory, "*.txt")) + glob.glob(os.path.join(directory, "*_times.csv"))
+    inputs += glob.glob(os.path.join(directory, "*rps.csv"))
+    inputs += glob.glob(os.path.join(directory, SAMPLES_FILENAME))
+    digest = hashlib.sha256(json.dumps(options, sort_keys=True).encode())
+    for path in CODE_FILES + sorted(inputs):
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def build_dataset_cached(directory, force=False, **kwargs):
+    """
+    Build and write the dataset of directory unless a dataset built from
+    identical inputs is already there. Returns "built" or "cached".
+    """
+    output = dataset_path(directory, kwargs.get("time", "10m"))
+    hash_path = output + ".sha256"
+    digest = input_hash(directory, **kwargs)
+    if not force and os.path.exists(output) and os.path.exists(hash_path):
+        with open(hash_path) as f:
+            if f.read().strip() == digest:
+                return "cached"
+
+    build_dataset(directory, write=True, **kwargs)
+    with open(hash_path, "w") as f:
+        f.write(digest + "\n")
+    return "built"
+
+
+def find_metric_dirs(root):
+    """
+    Find every raw collector output directory under root, i.e. every
+    <metric folder> holding an RPS log (rps.csv/rps.txt or the rt_ variants)
+    next to service logs.
+    """
+    metric_dirs = set()
+    for metric_folder_name in metric_folders:
+        for pattern in ("*rps.csv", "*rps.txt"):
+            for rps_file in glob.glob(os.path.join(root, "**", metric_folder_name, pattern), recursive=True):
+                metric_dirs.add(os.path.dirname(rps_file))
+    return sorted(metric_dirs)
+
+
+def build_datasets(directories, jobs=1, force=False, **kwargs):
+    """
+    Build datasets for many collector output directories, skipping those
+    whose inputs are unchanged since the last build. With jobs > 1 the
+    directories are processed in a pool of worker processes.
+    Returns {directory: "built" | "cached"}; directories that fail are logged
+    and skipped.
+    """
+    results = {}
+    if jobs > 1 and len(directories) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(build_dataset_cached, directory, force, **kwargs): directory
+                       for directory in directories}
+            for future in as_completed(futures):
+                directory = futures[future]
+                try:
+                    results[directory] = future.result()
+                except Exception as e:
+                    print(f"Failed to build dataset for {directory}: {e}")
+    else:
+        for directory in directories:
+            try:
+                results[directory] = build_dataset_cached(directory, force, **kwargs)
+            except Exception as e:
+                print(f"Failed to build dataset for {directory}: {e}")
+
+    for directory in sorted(results):
+        print(f"{results[directory]}: {dataset_path(directory, kwargs.get('time', '10m'))}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-t", "--time", default="10m")
+    parser.add_argument("-r", "--realtime", action='store_true')
+    parser.add_argument("-v", "--version", default="new")
+    parser.add_argument("-c", "--columnar", action='store_true',
+                        help=f"Read typed samples from <metric>/{SAMPLES_FILENAME} instead of parsing the text logs")
+    parser.add_argument("-d", "--dir", default=None,
+                        help="Collector output directory (default: the metric folders in the working directory)")
+    parser.add_argument("--results-root", default=None,
+                        help="Build datasets for every collector output directory under this root")
+    parser.add_argument("-i", "--interval", default=None, type=float,
+                        help="Alignment grid spacing in seconds (default: inferred from the logs)")
+    parser.add_argument("--tolerance", default=None, type=float,
+                        help="Maximum distance in seconds to a matched sample (default: half an interval)")
+    parser.add_argument("-j", "--jobs", default=1, type=int,
+                        help="Worker processes for building several datasets (0: one per CPU core)")
+    parser.add_argument("-f", "--force", action='store_true',
+                        help="Rebuild datasets even if their inputs are unchanged")
+
+    args = parser.parse_args(argv)
+
+    if args.results_root:
+        directories = find_metric_dirs(args.results_root)
+    elif args.dir:
+        directories = [args.dir]
+    else:
+        print(f"Reading all metric folders in {os.getcwd()}")
+        directories = metric_folders
+
+    jobs = args.jobs or os.cpu_count()
+    datasets = build_datasets(directories, jobs=jobs, force=args.force, time=args.time, realtime=args.realtime,
+                              version=args.version, columnar=args.columnar, interval=args.interval,
+                              tolerance=args.tolerance)
+    if len(datasets) < len(directories):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import copy
+import datetime
+import hashlib
+import itertools
+import json
+import os
+
+import yaml
+
+DEFAULT_RESOURCES = {"req": {"cpu": "1000m", "memory": "2Gi"}, "lim": {"cpu": "2000m", "memory": "2Gi"}}
+METRIC_NAMES = ("cpu", "memory")
+
+# Per-service autoscaling policy, keyed by Deployment name; "default" applies
+# to every service and is the base of the named entries. The stateful MySQL
+# teastore-db is not autoscaled, and teastore-webui gets stabilization
+# windows so it stops flapping between replica counts.
+DEFAULT_AUTOSCALING = {
+    "default": {"exclude": False, "min": 1, "max": 20},
+    "teastore-db": {"exclude": True},
+    "teastore-webui": {
+        "behavior": {
+            "scaleUp": {"stabilizationWindowSeconds": 60,
+                        "policies": [{"type": "Percent", "value": 100, "periodSeconds": 60}]},
+            "scaleDown": {"stabilizationWindowSeconds": 300,
+                          "policies": [{"type": "Percent", "value": 50, "periodSeconds": 60}]},
+        },
+    },
+}
+POLICY_KEYS = {"exclude", "min", "max", "metrics", "behavior"}
+
+
+def merge(base, override):
+    """
+    Recursively merge override into a copy of base. Mappings merge key by
+    key; any other value (lists included) replaces the base value.
+    """
+    merged = copy.deepcopy(base)
+    for key, value in (override or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+class ExperimentSpec:
+    """
+    One experiment (one cell of a matrix): the container resources, the HPA
+    metrics and targets, JAVA_TOOL_OPTIONS overrides and the run duration.
+
+      name:        results path of the cell, e.g. "res_500m/fixed_config/cpu_50"
+      resources:   {"req": {"cpu", "memory"}, "lim": {"cpu", "memory"}} for every container
+      metrics:     [{"name": "cpu" | "memory", "target": <averageUtilization %>}, ...];
+                   empty means no HPAs
+      autoscaling: {deployment | "default": policy}, merged onto DEFAULT_AUTOSCALING;
+                   a policy may set exclude (no HPA), min, max, metrics (replacing
+                   the experiment's metrics for that service) and behavior (the
+                   autoscaling/v2 scaleUp/scaleDown block, null for none)
+      jvm_options: {deployment: JAVA_TOOL_OPTIONS value, or None to remove it}
+      duration:    run length, e.g. "2h"
+      manifest:    base manifest the HPA config is generated from
+      node_selector: {label: value} nodeSelector for every pod, e.g. to pin a
+                   cell to its own node pool when cells run in parallel
+    """
+
+    def __init__(self, name="default", resources=None, metrics=None, jvm_options=None, duration="10m",
+                 manifest="manifest.yaml", node_selector=None, autoscaling=None):
+        self.name = name
+        self.resources = merge(DEFAULT_RESOURCES, resources)
+        self.metrics = list(metrics or [])
+        self.jvm_options = dict(jvm_options or {})
+        self.duration = str(duration)
+        self.manifest = manifest
+        self.node_selector = dict(node_selector or {})
+        self.autoscaling = merge(DEFAULT_AUTOSCALING, autoscaling)
+        self.validate()
+
+    def validate(self):
+        for side in ("req", "lim"):
+            for resource in ("cpu", "memory"):
+                if not self.resources.get(side, {}).get(resource):
+                    raise ValueError(f"{self.name}: resources.{side}.{resource} is required")
+        self._validate_metrics(self.metrics, self.name)
+        for service, overrides in self.autoscaling.items():
+            where = f"{self.name}: autoscaling.{service}"
+            unknown = set(overrides or {}) - POLICY_KEYS
+            if unknown:
+                raise ValueError(f"{where}: unknown keys {sorted(unknown)}")
+            policy = self.policy_for(service)
+            if not isinstance(policy["min"], int) or not isinstance(policy["max"], int) \
+                    or not 1 <= policy["min"] <= policy["max"]:
+                raise ValueError(f"{where}: needs integer replicas with 1 <= min <= max")
+            if policy.get("metrics") is not None:
+                self._validate_metrics(policy["metrics"], where)
+
+    @staticmethod
+    def _validate_metrics(metrics, where):
+        for metric in metrics:
+            if metric.get("name") not in METRIC_NAMES:
+                raise ValueError(f"{where}: unknown metric {metric.get('name')!r}, expected one of {METRIC_NAMES}")
+            if not isinstance(metric.get("target"), int) or not 0 < metric["target"] <= 1000:
+                raise ValueError(f"{where}: metric {metric['name']} needs an integer target (percent)")
+
+    @classmethod
+    def from_dict(cls, data, name=None):
+        data = dict(data)
+        unknown = set(data) - {"name", "resources", "metrics", "jvm_options", "duration", "manifest",
+                                 "node_selector", "autoscaling"}
+        if unknown:
+            raise ValueError(f"{name or data.get('name')}: unknown experiment keys {sorted(unknown)}")
+        if name is not None:
+            data["name"] = name
+        return cls(**data)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "resources": copy.deepcopy(self.resources),
+            "metrics": copy.deepcopy(self.metrics),
+            "jvm_options": dict(self.jvm_options),
+            "duration": self.duration,
+            "manifest": self.manifest,
+            "node_selector": dict(self.node_selector),
+            "autoscaling": copy.deepcopy(self.autoscaling),
+        }
+
+    def metric_names(self):
+        return [metric["name"] for metric in self.metrics]
+
+    def policy_for(self, service):
+        """
+        The effective autoscaling policy of one Deployment.
+        """
+        return merge(self.autoscaling.get("default") or {}, self.autoscaling.get(service) or {})
+
+    def hpa_metrics(self, service=None):
+        """
+        The autoscaling/v2 "metrics" list for the HPA of service (by default
+        the experiment-wide metrics).
+        """
+        metrics = self.metrics
+        if service is not None and self.policy_for(service).get("metrics") is not None:
+            metrics = self.policy_for(service)["metrics"]
+        return [{
+            "type": "Resource",
+            "resource": {"name": metric["name"],
+                         "target": {"type": "Utilization", "averageUtilization": metric["target"]}}
+        } for metric in metrics]
+
+    def hpa_spec(self, service):
+        """
+        The HPA spec of service, or None when it is not autoscaled (excluded,
+        or no metrics at all).
+        """
+        policy = self.policy_for(service)
+        metrics = self.hpa_metrics(service)
+        if policy.get("exclude") or not metrics:
+            return None
+        hpa_spec = {
+            "scaleTargetRef": {"apiVersion": "apps/v1", "kind": "Deployment", "name": service},
+            "minReplicas": policy["min"],
+            "maxReplicas": policy["max"],
+            "metrics": metrics,
+        }
+        if policy.get("behavior"):
+            hpa_spec["behavior"] = copy.deepcopy(policy["behavior"])
+        return hpa_spec
+
+
+def load_matrix(path):
+    """
+    Expand a YAML/JSON experiment matrix into ExperimentSpecs, in run order.
+
+    The file holds optional "defaults" (any ExperimentSpec field, e.g.
+    duration and resources) and "axes": a list of mappings from a label to
+    the overrides it applies. Every combination of one label per axis is a
+    cell named "<label 1>/<label 2>/...", with the overrides merged onto the
+    defaults in axis order. A plain "experiments" list of named specs is
+    accepted as well.
+    """
+    with open(path) as f:
+        matrix = yaml.safe_load(f) or {}
+
+    defaults = matrix.get("defaults") or {}
+    specs = []
+    for experiment in matrix.get("experiments") or []:
+        specs.append(ExperimentSpec.from_dict(merge(defaults, experiment)))
+
+    axes = matrix.get("axes") or []
+    if axes:
+        for cell in itertools.product(*[list(axis.items()) for axis in axes]):
+            data = defaults
+            for _, overrides in cell:
+                data = merge(data, overrides)
+            specs.append(ExperimentSpec.from_dict(data, name="/".join(label for label, _ in cell)))
+
+    names = [spec.name for spec in specs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"{path}: duplicate experiment names {duplicates}")
+    return specs
+
+
+def cell_hash(spec, **options):
+    """
+    Hash of everything a cell's raw data depends on: its spec, the contents
+    of its base manifest and the collector options that shape the run.
+    """
+    digest = hashlib.sha256(json.dumps({"spec": spec.to_dict(), "options": options}, sort_keys=True).encode())
+    with open(spec.manifest, "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+class SweepManifest:
+    """
+    Checkpoint of a matrix sweep, kept as JSON at path: every completed cell
+    with the hash of its inputs (cell_hash) and of its dataset inputs, and
+    every failed cell. A restarted sweep skips the cells recorded as complete
+    with unchanged inputs and retries the rest.
+    The file is replaced atomically, so a crash never leaves it half written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.cells = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.cells = json.load(f).get("cells", {})
+
+    def status(self, name):
+        """
+        "complete", "failed", or None for a cell the sweep never finished.
+        """
+        entry = self.cells.get(name)
+        return None if entry is None else entry.get("status", "complete")
+
+    def is_complete(self, name, inputs):
+        return self.status(name) == "complete" and self.cells[name].get("inputs") == inputs
+
+    def mark_complete(self, name, inputs, **details):
+        self._record(name, dict(details, status="complete", inputs=inputs))
+
+    def mark_failed(self, name, inputs, error):
+        self._record(name, {"status": "failed", "inputs": inputs, "error": str(error)})
+
+    def _record(self, name, entry):
+        entry["completed"] = datetime.datetime.now().isoformat(timespec="seconds")
+        self.cells[name] = entry
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"cells": self.cells}, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
@@ -0,0 +1,232 @@
+import http.client
+import json
+import logging
+import os
+import ssl
+import subprocess
+import threading
+
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from utils import parse_quantity
+
+# Service account mount used when the collector runs inside the cluster
+SERVICE_ACCOUNT_DIR = "/var/run/secrets/kubernetes.io/serviceaccount"
+# Default for out-of-cluster use: `kubectl proxy` handles auth for us
+KUBECTL_PROXY_URL = "http://127.0.0.1:8001"
+
+
+def deployment_for_pod(pod_name, labels=None):
+    """
+    Map a pod to its Deployment. TeaStore pods carry a run=<deployment> label;
+    otherwise fall back to the <deployment>-<replicaset hash>-<pod hash> name.
+    """
+    if labels and labels.get("run"):
+        return labels["run"]
+    return pod_name.rsplit("-", 2)[0]
+
+
+def build_snapshot(deployment_items, hpa_items, usage):
+    """
+    Normalize raw API objects into the snapshot layout shared by all sources:
+    {"hpas": {deployment: hpa}, "deployments": {deployment: deployment},
+     "usage": {deployment: [cpu_millicores, memory_bytes, pods]}}
+    """
+    deployments = {d["metadata"]["name"]: d for d in deployment_items}
+    namespaces = {d["metadata"].get("namespace") for d in deployments.values()}
+
+    hpas = {}
+    for h in hpa_items:
+        if h["metadata"].get("namespace") not in namespaces:
+            continue
+        target = (h.get("spec") or {}).get("scaleTargetRef") or {}
+        if target.get("kind") == "Deployment":
+            hpas[target["name"]] = h
+
+    return {"hpas": hpas, "deployments": deployments, "usage": usage}
+
+
+class MetricsSource:
+    """
+    A backend that returns one cluster snapshot per call to snapshot().
+    """
+
+    def snapshot(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class KubectlMetricsSource(MetricsSource):
+    """
+    Fallback backend: three kubectl calls per snapshot.
+    """
+
+    def __init__(self, namespace="default"):
+        self.namespace = namespace
+
+    def _run_json(self, cmd):
+        res = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+        if res.returncode != 0 or not res.stdout.strip():
+            logging.warning(f"'{cmd}' failed: {res.stderr.strip()}")
+            return {"items": []}
+        return json.loads(res.stdout)
+
+    def snapshot(self):
+        deployment_items = self._run_json(f"kubectl get deploy -n {self.namespace} -o json")["items"]
+        hpa_items = self._run_json(f"kubectl get hpa -n {self.namespace} -o json")["items"]
+
+        usage = defaultdict(lambda: [0, 0, 0])
+        top_res = subprocess.run(f"kubectl top pods -n {self.namespace} -l run --no-headers", shell=True, capture_output=True, text=True)
+        if top_res.returncode == 0 and top_res.stdout.strip():
+            for pod_line in top_res.stdout.strip().split("\n"):
+                p_parts = pod_line.split()
+                if len(p_parts) >= 3:
+                    pod_usage = usage[deployment_for_pod(p_parts[0])]
+                    pod_usage[0] += parse_quantity(p_parts[1])
+                    pod_usage[1] += parse_quantity(p_parts[2])
+                    pod_usage[2] += 1
+
+        return build_snapshot(deployment_items, hpa_items, usage)
+
+
+class ApiServerMetricsSource(MetricsSource):
+    """
+    Talks to the API server and metrics.k8s.io directly over one persistent
+    keep-alive connection, so a snapshot costs three HTTP round-trips and no
+    process creation.
+
+    Without an explicit server, uses the in-cluster service account when
+    available and a local `kubectl proxy` otherwise.
+    """
+
+    def __init__(self, server=None, namespace="default", token=None, ca_file=None, timeout=10):
+        in_cluster = server is None and "KUBERNETES_SERVICE_HOST" in os.environ
+        if in_cluster:
+            server = f"https://{os.environ['KUBERNETES_SERVICE_HOST']}:{os.environ.get('KUBERNETES_SERVICE_PORT', '443')}"
+            with open(f"{SERVICE_ACCOUNT_DIR}/token") as f:
+                token = token or f.read().strip()
+            ca_file = ca_file or f"{SERVICE_ACCOUNT_DIR}/ca.crt"
+        self.url = urlsplit(server or KUBECTL_PROXY_URL)
+        self.namespace = namespace
+        self.timeout = timeout
+        self.headers = {"Accept": "application/json", "Connection": "keep-alive"}
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        self.ssl_context = ssl.create_default_context(cafile=ca_file) if self.url.scheme == "https" else None
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        if self.url.scheme == "https":
+            return http.client.HTTPSConnection(self.url.hostname, self.url.port or 443,
+                                               timeout=self.timeout, context=self.ssl_context)
+        return http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=self.timeout)
+
+    def _get(self, path):
+        with self.lock:
+            # Retry once on a fresh connection if the server closed the idle one
+            for attempt in range(2):
+                if self.conn is None:
+                    self.conn = self._connect()
+                try:
+                    self.conn.request("GET", path, headers=self.headers)
+                    res = self.conn.getresponse()
+                    body = res.read()
+                except (http.client.HTTPException, OSError) as e:
+                    self.conn.close()
+                    self.conn = None
+                    if attempt == 1:
+                        logging.warning(f"GET {path} failed: {e}")
+                        return {"items": []}
+                    continue
+                if res.status != 200:
+                    logging.warning(f"GET {path} returned {res.status}: {body[:200]}")
+                    return {"items": []}
+                return json.loads(body)
+
+    def snapshot(self):
+        ns = self.namespace
+        deployment_items = self._get(f"/apis/apps/v1/namespaces/{ns}/deployments")["items"]
+        hpa_items = self._get(f"/apis/autoscaling/v2/namespaces/{ns}/horizontalpodautoscalers")["items"]
+        # The list endpoints omit per-item namespace on some servers; keep filtering consistent
+        for item in deployment_items + hpa_items:
+            item["metadata"].setdefault("namespace", ns)
+
+        usage = defaultdict(lambda: [0, 0, 0])
+        pod_metrics = self._get(f"/apis/metrics.k8s.io/v1beta1/namespaces/{ns}/pods?labelSelector=run")
+        for pod in pod_metrics["items"]:
+            md = pod["metadata"]
+            pod_usage = usage[deployment_for_pod(md["name"], md.get("labels"))]
+            for container in pod.get("containers") or []:
+                pod_usage[0] += parse_quantity(container["usage"].get("cpu"))
+                pod_usage[1] += parse_quantity(container["usage"].get("memory"))
+            pod_usage[2] += 1
+
+        return build_snapshot(deployment_items, hpa_items, usage)
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+class FakeMetricsSource(MetricsSource):
+    """
+    Replays snapshots recorded with RecordingMetricsSource (one JSON object per
+    line). The last snapshot is repeated once the recording is exhausted.
+    """
+
+    def __init__(self, replay_file):
+        with open(replay_file) as f:
+            self.snapshots = [json.loads(line) for line in f if line.strip()]
+        if not self.snapshots:
+            raise ValueError(f"No snapshots recorded in {replay_file}")
+        self.position = 0
+        self.lock = threading.Lock()
+
+    def snapshot(self):
+        with self.lock:
+            snapshot = self.snapshots[min(self.position, len(self.snapshots) - 1)]
+            self.position += 1
+        return snapshot
+
+
+class RecordingMetricsSource(MetricsSource):
+    """
+    Wraps another source and appends every snapshot it returns to a JSON lines
+    file that FakeMetricsSource can replay later.
+    """
+
+    def __init__(self, source, record_file):
+        self.source = source
+        self.record_file = open(record_file, "a")
+        self.lock = threading.Lock()
+
+    def snapshot(self):
+        snapshot = self.source.snapshot()
+        with self.lock:
+            self.record_file.write(json.dumps(snapshot))
+            self.record_file.write("\n")
+            self.record_file.flush()
+        return snapshot
+
+    def close(self):
+        self.source.close()
+        self.record_file.close()
+
+
+def create_metrics_source(kind, server=None, namespace="default", replay_file=None, record_file=None):
+    if kind == "api":
+        source = ApiServerMetricsSource(server=server, namespace=namespace)
+    elif kind == "fake":
+        source = FakeMetricsSource(replay_file)
+    else:
+        source = KubectlMetricsSource(namespace)
+
+    if record_file:
+        source = RecordingMetricsSource(source, record_file)
+    return source
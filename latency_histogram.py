@@ -0,0 +1,135 @@
+import math
+import threading
+import time
+
+from collections import defaultdict
+
+# Values are recorded in integer microseconds. Below 2**SUB_BUCKET_BITS each
+# value has its own bucket; above it every power of two is split into
+# 2**(SUB_BUCKET_BITS - 1) linear buckets, so a reported percentile (the
+# bucket midpoint) is within 1% of the true value, as in an HDR histogram.
+SUB_BUCKET_BITS = 7
+
+
+def bucket_for(value_us):
+    """
+    Lower bound of the bucket holding value_us.
+    """
+    shift = max(0, value_us.bit_length() - SUB_BUCKET_BITS)
+    return (value_us >> shift) << shift
+
+
+def bucket_width(lower_us):
+    return 1 << max(0, lower_us.bit_length() - SUB_BUCKET_BITS)
+
+
+class LatencyHistogram:
+    """
+    Response-time histogram for one endpoint over one interval. Histograms
+    merge exactly, so per-worker intervals add up to the cluster-wide one.
+    """
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.total = 0
+        self.errors = 0
+
+    def record(self, response_time_ms, error=False):
+        self.counts[bucket_for(max(0, int(round(response_time_ms * 1000))))] += 1
+        self.total += 1
+        if error:
+            self.errors += 1
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] += count
+        self.total += other.total
+        self.errors += other.errors
+        return self
+
+    def percentile(self, q):
+        """
+        Response time in ms at quantile q (0 < q <= 1); 0 when empty.
+        """
+        if self.total == 0:
+            return 0
+        rank = max(1, math.ceil(q * self.total))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                # Report the bucket midpoint
+                return round((bucket + (bucket_width(bucket) - 1) / 2) / 1000, 3)
+        return 0
+
+    def summary(self, window_seconds):
+        return {
+            "count": self.total,
+            "rps": self.total / window_seconds if window_seconds > 0 else 0,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "p999": self.percentile(0.999),
+            "error_rate": self.errors / self.total if self.total else 0,
+        }
+
+    def to_dict(self):
+        # JSON/msgpack-friendly: bucket keys become [bucket, count] pairs
+        return {"counts": [[b, c] for b, c in self.counts.items()], "total": self.total, "errors": self.errors}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        for bucket, count in data["counts"]:
+            histogram.counts[bucket] += count
+        histogram.total = data["total"]
+        histogram.errors = data["errors"]
+        return histogram
+
+
+class IntervalRecorder:
+    """
+    Collects one LatencyHistogram per endpoint for the current interval.
+
+    Load-generating processes record() every request; a worker drain()s its
+    histograms into each report to the master, which merge()s them. The
+    process writing the RPS log calls rotate() once per interval to take the
+    finished window and start the next one.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = defaultdict(LatencyHistogram)
+        self.window_start = time.time()
+
+    def record(self, key, response_time_ms, error=False):
+        with self.lock:
+            self.histograms[key].record(response_time_ms, error)
+
+    def drain(self):
+        """
+        Serialized histograms recorded since the last drain, as
+        [[name, method, histogram], ...]; the recorder is reset.
+        """
+        with self.lock:
+            histograms, self.histograms = self.histograms, defaultdict(LatencyHistogram)
+        return [[key[0], key[1], h.to_dict()] for key, h in histograms.items()]
+
+    def merge(self, serialized):
+        with self.lock:
+            for name, method, data in serialized or []:
+                self.histograms[(name, method)].merge(LatencyHistogram.from_dict(data))
+
+    def rotate(self, now=None):
+        """
+        Returns (window_seconds, {key: LatencyHistogram}) for the interval
+        that just ended and starts a new one.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            histograms, self.histograms = self.histograms, defaultdict(LatencyHistogram)
+            window_seconds, self.window_start = now - self.window_start, now
+        return window_seconds, histograms
+
+    def reset(self):
+        self.rotate()
@@ -2,6 +2,10 @@
 #
 # TeaStore Locust load generator (Poisson replay + RPS logging)
 #
+# Runs standalone or distributed (--processes N, or --master/--worker): in
+# distributed mode each worker replays 1/N of every endpoint's rate and only
+# the master writes rps.csv, from the merged worker stats.
+#
 # Adapted from Online Boutique Locustfile: replaces endpoints with TeaStore
 # equivalents while keeping the same CSV-driven Poisson replay and RPS export.
 #
@@ -11,15 +15,23 @@ import math
 import os
 import random
 import threading
-from collections import defaultdict
+from array import array
+from collections import deque
 
-from locust import FastHttpUser, TaskSet, between, events, task
+from locust import FastHttpUser, TaskSet, constant, events, task
+from locust.runners import STATE_MISSING, MasterRunner, WorkerRunner
 from faker import Faker
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+from latency_histogram import IntervalRecorder, LatencyHistogram
+from realtime_stream import RealtimeStream, build_frame
+from rps_log import RPS_FILENAME, RT_RPS_FILENAME, RpsLogWriter
+from utils import interval_string_to_seconds
 import csv
-import datetime
-import json
 import logging
-import socket
 import time
 
 logging.basicConfig(level=logging.ERROR)
@@ -30,9 +42,11 @@ real_time = False
 last_record_time = time.time()
 
 # --- RPS replay globals ---
-rps_schedules = {}        # endpoint_name -> list of rps values (per 15s bucket)
+rps_schedules = {}        # endpoint_name -> read-only view of rps values (per 15s bucket), loaded once per process
+schedule_lock = threading.Lock()
 replay_interval = 15.0    # seconds per CSV row
 SCALE_FACTOR = 0.03       # scale factor for RPS values in CSVs
+REPLAY_LEAD = 5.0         # seconds between the master's plan and the shared replay start
 
 @events.init_command_line_parser.add_listener
 def _(parser):
@@ -40,79 +54,96 @@ def _(parser):
         "-d", "--dir",
         type=str,
         default="./cpu_memory_",
-        help="Directory to write rps.txt / rt_rps.txt"
+        help=f"Directory to write {RPS_FILENAME} / {RT_RPS_FILENAME}"
     )
     parser.add_argument(
         "--realtime",
         action="store_true",
         help="Enable real-time RPS/p95/p99 socket export"
     )
+    parser.add_argument(
+        "--realtime-host",
+        type=str,
+        default="localhost",
+        help="Consumer of the real-time stream (see realtime_receiver.py)"
+    )
+    parser.add_argument(
+        "--realtime-port",
+        type=int,
+        default=8003,
+        help="Port of the real-time stream consumer"
+    )
+    parser.add_argument(
+        "--replay-start",
+        type=str,
+        default="0s",
+        help="Trace offset to start the replay from, e.g. 6h or 90m"
+    )
+    parser.add_argument(
+        "--replay-end",
+        type=str,
+        default="",
+        help="Trace offset to stop the replay at, e.g. 8h (default: end of trace)"
+    )
+    parser.add_argument(
+        "--replay-speedup",
+        type=float,
+        default=1.0,
+        help="Time-compression factor: 4 replays each 15s bucket in 3.75s at 4x its rate"
+    )
 
 @events.test_start.add_listener
 def _(environment, **kwargs):
     print(f"Service files directory: {service_files_dir}")
     print(f"Realtime: {real_time}")
 
-send_every = 0  # seconds (0 = send every time threshold is hit)
-start_time = None
+# Real-time export: one persistent connection fed from a background queue,
+# created on test_start when --realtime is set
+realtime_stream = None
+rps_log = None            # RpsLogWriter, open for the duration of a run
+REALTIME_FIELDS = ["rps", "p95", "p99"]
 
-def send_dict_via_socket(dictionary, host='localhost', port=8003):
-    """
-    Send current per-endpoint RPS/p95/p99 as JSON over TCP.
-    Kept identical to your original code.
-    """
-    global start_time
-    client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    if len(dictionary) == 18:  # magic number from your original script
-        try:
-            if start_time is None:
-                start_time = time.time()
-            elif time.time() >= start_time + send_every:
-                start_time = time.time()
-                client.connect((host, port))
-
-                json_data = json.dumps(dictionary).encode('utf-8')
-                client.send(json_data)
-
-                response = client.recv(1024).decode('utf-8')
-                print(f"Server response: {response}")
-        except ConnectionRefusedError as cre:
-            logging.info(cre)
-        finally:
-            client.close()
+# Per-interval latency histograms: every request is recorded here, workers
+# ship theirs to the master with each stats report, and record_rps() rotates
+# the window, so each RPS log row describes exactly one interval.
+interval_recorder = IntervalRecorder()
+
+@events.request.add_listener
+def on_request(request_type, name, response_time, exception=None, **kwargs):
+    interval_recorder.record((name, request_type), response_time, exception is not None)
+
+@events.report_to_master.add_listener
+def on_report_to_master(client_id, data, **kwargs):
+    data["interval_histograms"] = interval_recorder.drain()
+
+@events.worker_report.add_listener
+def on_worker_report(client_id, data, **kwargs):
+    interval_recorder.merge(data.get("interval_histograms"))
 
 def record_rps():
     """
-    Periodically writes RPS + latency percentiles per endpoint to a text file,
-    and optionally sends real-time stats via socket.
+    Periodically writes per-interval RPS + latency percentiles per endpoint to
+    the RPS log, and optionally queues them on the real-time stream.
     """
     global locust_environment, last_record_time, service_files_dir, real_time
-    if locust_environment:
+    if locust_environment and rps_log is not None:
         stats = locust_environment.runner.stats
-        filename = "rps.txt"
+        now = time.time()
+        window_seconds, histograms = interval_recorder.rotate(now)
+        endpoints = list(stats.entries) + [key for key in histograms if key not in stats.entries]
+        window = {
+            endpoint: histograms.get(endpoint, LatencyHistogram()).summary(window_seconds)
+            for endpoint in endpoints
+        }
+
         if real_time is True:
-            filename = "rt_rps.txt"
-            real_time_stats = {
-                key: value
-                for endpoint, data in stats.entries.items()
-                for key, value in [
-                    (f"{endpoint}_rps", data.current_rps),
-                    (f"{endpoint}_p95", data.get_response_time_percentile(0.95)),
-                    (f"{endpoint}_p99", data.get_response_time_percentile(0.99))
-                ]
-            }
-            send_dict_via_socket(real_time_stats)
-
-        with open(f"{service_files_dir}/{filename}", "a") as rps_output_file:
-            for endpoint, data in stats.entries.items():
-                rps = data.current_rps
-                p95 = data.get_response_time_percentile(0.95)
-                p99 = data.get_response_time_percentile(0.99)
-                rps_output_file.write(f"{endpoint}_rps: {rps};")
-                rps_output_file.write(f"{endpoint}_p95: {p95};")
-                rps_output_file.write(f"{endpoint}_p99: {p99};")
-            rps_output_file.write("\n")
-            rps_output_file.close()
+            if realtime_stream is not None and window:
+                realtime_stream.send(build_frame(window_seconds, {
+                    endpoint: {field: data[field] for field in REALTIME_FIELDS}
+                    for endpoint, data in window.items()
+                }, timestamp=now))
+
+        rps_log.write_window(now, window_seconds, window)
 
 @events.test_start.add_listener
 def on_test_start(environment, **kwargs):
@@ -125,11 +156,52 @@ def on_test_start(environment, **kwargs):
     last_record_time = time.time()
     locust_environment = environment
 
-    t = threading.Thread(target=periodic_rps_writer, daemon=True)
-    t.start()
-
-request_latencies = defaultdict(list)
-write_lock = threading.Lock()
+    if isinstance(environment.runner, MasterRunner):
+        send_replay_plans(environment.runner)
+    if isinstance(environment.runner, WorkerRunner):
+        # The master aggregates worker stats and writes the one RPS log
+        return
+    get_rps_schedules("alibaba_workload")
+
+    rps_writer_stop.clear()
+    interval_recorder.reset()
+    global realtime_stream, rps_log
+    if rps_log is None:
+        filename = RT_RPS_FILENAME if real_time else RPS_FILENAME
+        rps_log = RpsLogWriter(os.path.join(service_files_dir, filename))
+    if real_time and realtime_stream is None:
+        realtime_stream = RealtimeStream(environment.parsed_options.realtime_host,
+                                         environment.parsed_options.realtime_port)
+    global rps_writer_thread
+    rps_writer_thread = threading.Thread(target=periodic_rps_writer, daemon=True)
+    rps_writer_thread.start()
+
+@events.test_stop.add_listener
+def on_test_stop(environment, **kwargs):
+    """
+    Stop the RPS writer, write the last (partial) window and tear down the
+    replay so the next run starts clean.
+    """
+    global realtime_stream, rps_log, rps_writer_thread
+    rps_writer_stop.set()
+    # Let the writer finish any window it is writing before the final one
+    if rps_writer_thread is not None:
+        rps_writer_thread.join()
+        rps_writer_thread = None
+    try:
+        record_rps()
+    except Exception as e:
+        logging.info(f"rps writer error: {e}")
+    stop_replay()
+    if rps_log is not None:
+        rps_log.close()
+        rps_log = None
+    if realtime_stream is not None:
+        realtime_stream.close()
+        realtime_stream = None
+
+rps_writer_stop = threading.Event()
+rps_writer_thread = None
 
 fake = Faker()
 
@@ -153,125 +225,324 @@ fake = Faker()
 CATEGORY_IDS = [0, 1, 2, 3, 4, 5]
 PRODUCT_IDS = list(range(1, 200))  # adjust to your dataset
 PAGES = [1, 2, 3]
+TEASTORE_USERS = 100  # the persistence service seeds user0..user99 with this password
+TEASTORE_PASSWORD = "password"
 
 BASE_PATH = "/tools.descartes.teastore.webui"
 
+class UrlPool:
+    """
+    Pre-built request paths handed out in random order. Indices are drawn a
+    batch at a time (vectorized when numpy is available), so a request costs
+    a list lookup instead of random.choice plus URL formatting.
+    """
+
+    def __init__(self, urls, batch_size=4096):
+        self.urls = list(urls)
+        self.batch_size = batch_size
+        self.batch = iter(())
+
+    def _refill(self):
+        if np is not None:
+            indices = np.random.randint(0, len(self.urls), self.batch_size).tolist()
+            return iter([self.urls[i] for i in indices])
+        return iter(random.choices(self.urls, k=self.batch_size))
+
+    def next(self):
+        url = next(self.batch, None)
+        if url is None:
+            self.batch = self._refill()
+            url = next(self.batch)
+        return url
+
+INDEX_URL = f"{BASE_PATH}/"
+CART_URL = f"{BASE_PATH}/cart"
+CART_ACTION_URL = f"{BASE_PATH}/cartAction"
+CATEGORY_URLS = UrlPool(f"{BASE_PATH}/category?category={category}&page={page}"
+                        for category in CATEGORY_IDS for page in PAGES)
+PRODUCT_URLS = UrlPool(f"{BASE_PATH}/product?id={product_id}" for product_id in PRODUCT_IDS)
+# /cartAction is an exact servlet mapping: the product goes in the form body
+CART_PRODUCT_IDS = UrlPool(str(product_id) for product_id in PRODUCT_IDS)
+
 def index(l):
-    l.client.get(f"{BASE_PATH}/", name="index")
+    l.client.get(INDEX_URL, name="index")
 
 def browseCategory(l):
-    category = random.choice(CATEGORY_IDS)
-    page = random.choice(PAGES)
-    l.client.get(
-        f"{BASE_PATH}/category?category={category}&page={page}",
-        name="browseCategory",
-    )
+    l.client.get(CATEGORY_URLS.next(), name="browseCategory")
 
 def viewProduct(l):
-    product_id = random.choice(PRODUCT_IDS)
-    l.client.get(f"{BASE_PATH}/product?id={product_id}", name="viewProduct")
+    l.client.get(PRODUCT_URLS.next(), name="viewProduct")
 
 def viewCart(l):
-    l.client.get(f"{BASE_PATH}/cart", name="viewCart")
+    l.client.get(CART_URL, name="viewCart")
 
 def addToCart(l):
-    product_id = random.choice(PRODUCT_IDS)
-    l.client.post(
-        f"{BASE_PATH}/cartAction/productid={product_id}&addToCart=Add+to+Cart",
-        name="addToCart",
-    )
+    """
+    Counts the item only when TeaStore accepted it (2xx, or the redirect
+    back to the cart), so checkout knows whether the cart is really filled.
+    """
+    response = l.client.post(CART_ACTION_URL,
+                             {"productid": CART_PRODUCT_IDS.next(), "addToCart": "Add to Cart"},
+                             name="addToCart")
+    if 200 <= response.status_code < 400:
+        l.cart_items += 1
 
 def checkout(l):
+    """
+    Places an order for the session's cart. A session whose cart is empty
+    first adds a product (recorded as addToCart), and gives up if that fails,
+    so an order is never placed on an empty cart. The session stays logged
+    in, so an order sends no requests outside the trace's endpoints.
+    """
+    if l.cart_items == 0:
+        addToCart(l)
+        if l.cart_items == 0:
+            return
     viewCart(l)
-    l.client.post(f"{BASE_PATH}/cartAction",
-                  {"proceedToCheckout": "Checkout"},
+    l.client.post(CART_ACTION_URL,
+                  {"proceedtoCheckout": "Checkout"},
                   name="checkout")
-    l.client.post(f"{BASE_PATH}/cartAction",
-                  {"confirmOrder": "Confirm"},
+    l.client.post(CART_ACTION_URL,
+                  {
+                      "firstname": fake.first_name(),
+                      "lastname": fake.last_name(),
+                      "address1": fake.street_address(),
+                      "address2": fake.city(),
+                      "cardtype": "visa",
+                      "cardnumber": fake.credit_card_number(card_type="visa"),
+                      "expirydate": fake.credit_card_expire(date_format="%m/%Y"),
+                      "confirmOrder": "Confirm",
+                  },
                   name="checkout")
+    l.cart_items = 0
 
 def login(l):
     l.client.get(f"{BASE_PATH}/login", name="login")
     l.client.post(
         f"{BASE_PATH}/loginAction",
         {
-            "username": "user",
-            "password": "password",
+            "username": f"user{random.randrange(TEASTORE_USERS)}",
+            "password": TEASTORE_PASSWORD,
         },
         name="loginAction",
     )
 
 def logout(l):
-    l.client.post(f"{BASE_PATH}/loginAction/logout", name="logout")
+    l.client.post(f"{BASE_PATH}/loginAction", {"logout": ""}, name="logout")
 # ---------------------------------------------------------------------------
-# Poisson replay logic (unchanged from your Online Boutique script)
+# Endpoint dispatch
 # ---------------------------------------------------------------------------
 
 import gevent
+import gevent.event
+import gevent.pool
+
+# endpoint_name (from rps_schedules keys) -> TeaStore action, resolved once
+# per endpoint when the replay starts
+ENDPOINT_ACTIONS = {
+    "index": index,
+    "browseCategory": browseCategory,
+    "viewProduct": viewProduct,
+    "addToCart": addToCart,
+    "viewCart": viewCart,
+    "checkout": checkout,
+}
+# Endpoints served by sessions that have items in their cart when possible
+CART_ENDPOINTS = {"viewCart", "checkout"}
+
+def arrival_offsets(rate, duration):
+    """
+    Offsets of Poisson arrivals at rate per second within [0, duration),
+    drawn as one batch of exponential gaps per bucket.
+    """
+    expected = rate * duration
+    if np is not None:
+        offsets = np.cumsum(np.random.exponential(1.0 / rate, int(expected + 4 * math.sqrt(expected) + 16)))
+        while offsets[-1] < duration:
+            more = np.cumsum(np.random.exponential(1.0 / rate, int(expected) + 16)) + offsets[-1]
+            offsets = np.concatenate([offsets, more])
+        return offsets[:np.searchsorted(offsets, duration)].tolist()
+    offsets = []
+    t = random.expovariate(rate)
+    while t < duration:
+        offsets.append(t)
+        t += random.expovariate(rate)
+    return offsets
 
-def _call_endpoint(user_taskset, endpoint_name):
-    """
-    Map endpoint_name (from rps_schedules keys) to TeaStore actions.
-    """
-    if endpoint_name == "index":
-        index(user_taskset)
-    elif endpoint_name == "browseCategory":
-        browseCategory(user_taskset)
-    elif endpoint_name == "viewProduct":
-        viewProduct(user_taskset)
-    elif endpoint_name == "addToCart":
-        addToCart(user_taskset)
-    elif endpoint_name == "viewCart":
-        viewCart(user_taskset)
-    elif endpoint_name == "checkout":
-        checkout(user_taskset)
-    else:
-        # Unknown endpoint; ignore
-        print(f"Ignoring endpoint = {endpoint_name}")
-        pass
+# ---------------------------------------------------------------------------
+# Open-loop arrival engine: one set of arrival greenlets per load-generator
+# process generates exactly the scheduled rate per endpoint, and each arrival
+# borrows a session from the pool of running users. Every user is one
+# logged-in TeaStore session with its own cookie jar and cart; cart endpoints
+# go to sessions with a populated cart, the rest to sessions without one, so
+# adds accumulate into carts that checkouts then order. The user count (-u)
+# only sizes that pool; it no longer multiplies the offered load.
+#
+# The arrival and dispatch greenlets belong to replay_group, which is killed on
+# test_stop, so stopping or rescaling a run never waits on the replay.
+# ---------------------------------------------------------------------------
 
-def _drive_endpoint(user_taskset, endpoint_name, series, t0):
+class SessionPool:
     """
-    Drives one endpoint according to its RPS time series using
-    a Poisson process (exponential inter-arrival times).
+    Idle sessions (UserBehavior instances), split by whether their cart has
+    items. Only touched from greenlets, so no locking is needed.
     """
-    for i, rps in enumerate(series):
-        lam = rps
-        while time.time() - t0 < (i + 1) * replay_interval:
-            u = random.random()
-            if u == 0:
-                u = 1e-9
 
-            inter_arrival_time = -math.log(u) / lam
-            gevent.sleep(inter_arrival_time)
+    def __init__(self):
+        self.empty = deque()
+        self.carted = deque()
+        self.released = gevent.event.Event()
 
-            if time.time() - t0 >= (i + 1) * replay_interval:
-                break
-            try:
-                _call_endpoint(user_taskset, endpoint_name)
-            except Exception as e:
-                logging.info(e)
+    def put(self, session):
+        if session.stopped:
+            return
+        (self.carted if session.cart_items else self.empty).append(session)
+        self.released.set()
 
-def replay_poisson(user_taskset):
+    def get(self, prefer_cart=False):
+        """
+        Next idle session, from the preferred side when it has one; waits
+        until a session is released if none is idle.
+        """
+        pools = (self.carted, self.empty) if prefer_cart else (self.empty, self.carted)
+        while True:
+            for pool in pools:
+                while pool:
+                    session = pool.popleft()
+                    # Users stopped by a ramp-down leave the pool lazily
+                    if not session.stopped:
+                        return session
+            self.released.clear()
+            self.released.wait()
+
+client_pool = SessionPool()
+replay_group = gevent.pool.Group()
+replay_started = False
+
+# Distributed mode: the master gives each worker a share of every endpoint's
+# rate and a common t0, so the workers' 15s buckets line up and their
+# Poisson streams add up to the full schedule. Local runs use share 1, t0 now.
+replay_share = 1.0
+replay_t0 = None
+replay_plan = gevent.event.Event()
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    if isinstance(environment.runner, WorkerRunner):
+        environment.runner.register_message("replay_plan", on_replay_plan)
+    else:
+        replay_plan.set()
+
+def send_replay_plans(runner):
     """
-    Spawns one greenlet per endpoint, each replaying its schedule.
+    Master side: split the schedule evenly across the connected workers.
     """
-    if not rps_schedules:
+    workers = sorted(w.id for w in runner.clients.values() if w.state != STATE_MISSING)
+    t0 = time.time() + REPLAY_LEAD
+    for i, worker_id in enumerate(workers):
+        runner.send_message("replay_plan", {"t0": t0, "index": i, "count": len(workers)}, client_id=worker_id)
+    print(f"Replay split across {len(workers)} workers, starting at {t0:.3f}")
+
+def on_replay_plan(environment, msg, **kwargs):
+    """
+    Worker side: take this worker's share and the shared start time.
+    """
+    global replay_share, replay_t0
+    replay_share = 1.0 / max(1, msg.data["count"])
+    replay_t0 = msg.data["t0"]
+    print(f"Worker {msg.data['index'] + 1}/{msg.data['count']}: replaying {replay_share:.3f} of the schedule")
+    replay_plan.set()
+
+def _dispatch(action, prefer_cart=False):
+    """
+    Serve one arrival on the next idle session.
+    """
+    pool = client_pool
+    session = pool.get(prefer_cart)
+    try:
+        action(session)
+    except Exception as e:
+        logging.info(e)
+    finally:
+        pool.put(session)
+
+def _drive_endpoint(action, series, t0, share=1.0, speedup=1.0, prefer_cart=False):
+    """
+    Generates Poisson arrivals (exponential inter-arrival times) for one
+    endpoint at share times the rate of its RPS time series. Arrival times are
+    kept on an absolute timeline, so time spent dispatching never lowers the
+    rate; each arrival is dispatched in its own greenlet and never waits for
+    the last. Exponential gaps are memoryless, so each bucket's arrivals are
+    drawn afresh from its start.
+
+    With a speedup k each bucket lasts replay_interval / k seconds at k times
+    its rate, so every bucket still carries its original number of requests.
+    """
+    bucket_seconds = replay_interval / speedup
+    gevent.sleep(max(0.0, t0 - time.time()))
+    for i, rps in enumerate(series):
+        rps *= share * speedup
+        bucket_start = t0 + i * bucket_seconds
+        if rps > 0:
+            for offset in arrival_offsets(rps, bucket_seconds):
+                gevent.sleep(max(0.0, bucket_start + offset - time.time()))
+                replay_group.spawn(_dispatch, action, prefer_cart)
+        gevent.sleep(max(0.0, bucket_start + bucket_seconds - time.time()))
+
+def replay_window(options):
+    """
+    Returns (first_bucket, last_bucket, speedup) for the --replay-* options.
+    """
+    first = interval_string_to_seconds(options.replay_start) // int(replay_interval)
+    last = None
+    if options.replay_end:
+        last = interval_string_to_seconds(options.replay_end) // int(replay_interval)
+        if last <= first:
+            raise ValueError(f"--replay-end {options.replay_end} is not after --replay-start {options.replay_start}")
+    if options.replay_speedup <= 0:
+        raise ValueError(f"--replay-speedup must be positive, got {options.replay_speedup}")
+    return first, last, options.replay_speedup
+
+def start_replay(environment):
+    """
+    Spawns one arrival greenlet per endpoint, once per process. Workers wait
+    for the master's replay plan first.
+    """
+    global replay_started
+    if replay_started or not rps_schedules:
         return
+    replay_started = True
+    replay_group.spawn(_start_replay_when_planned, replay_window(environment.parsed_options))
 
-    t0 = time.time()
-    greens = []
+def _start_replay_when_planned(window):
+    first, last, speedup = window
+    replay_plan.wait()
+    t0 = replay_t0 if replay_t0 is not None else time.time()
     for endpoint, series in rps_schedules.items():
+        action = ENDPOINT_ACTIONS.get(endpoint)
+        if action is None:
+            print(f"Ignoring endpoint = {endpoint}")
+            continue
+        # Slicing the shared memoryview selects the window without copying
+        series = series[first:last]
         if not series or all(r <= 0 for r in series):
             print(f"Endpoint {endpoint} has no valid schedule; skipping")
             continue
-        g = gevent.spawn(_drive_endpoint, user_taskset, endpoint, series, t0)
-        greens.append(g)
+        replay_group.spawn(_drive_endpoint, action, series, t0, replay_share, speedup,
+                           endpoint in CART_ENDPOINTS)
 
-    gevent.joinall(greens)
-    for g in greens:
-        if not g.ready():
-            g.kill()
+def stop_replay():
+    """
+    Kills every arrival and in-flight dispatch greenlet and resets the
+    per-process replay state. Workers wait for a fresh plan on the next run.
+    """
+    global replay_started, replay_t0, client_pool
+    replay_group.kill(block=False)
+    client_pool = SessionPool()
+    replay_started = False
+    replay_t0 = None
+    if isinstance(getattr(locust_environment, "runner", None), WorkerRunner):
+        replay_plan.clear()
 
 def load_rps_files(dir_path):
     """
@@ -289,13 +560,14 @@ def load_rps_files(dir_path):
       4 -> viewCart
       5 -> checkout
     """
-    files = sorted(glob.glob("alibaba_workload/alibaba_*.csv"))
+    files = sorted(glob.glob(os.path.join(dir_path, "alibaba_*.csv")))
     csv_files = [f for f in files if os.path.isfile(f)]
     if len(csv_files) < 6:
         raise FileNotFoundError(
             f"WARNING: expected 6 RPS CSV files, found {len(csv_files)} in {dir_path}"
         )
 
+    global rps_schedules
     target_endpoints = [
         "index",
         "browseCategory",
@@ -304,24 +576,38 @@ def load_rps_files(dir_path):
         "viewCart",
         "checkout",
     ]
+    schedules = {}
     for i, endpoint in enumerate(target_endpoints):
         if i >= len(csv_files):
-            rps_schedules[endpoint] = []
+            schedules[endpoint] = memoryview(array("d")).toreadonly()
             continue
         path = csv_files[i]
-        rows = []
+        rows = array("d")
         with open(path, newline="") as fh:
             reader = csv.DictReader(fh)
-            #for _ in range(1440):
-            #    next(reader, None)
+            # Windowing (--replay-start/--replay-end) is applied at replay time
             for row in reader:
                 rps = float(row["rps"]) * SCALE_FACTOR
                 rows.append(rps)
-        rps_schedules[endpoint] = rows
+        # Shared by every user: hand out read-only views of one compact buffer
+        schedules[endpoint] = memoryview(rows).toreadonly()
+
+    # Swap in the complete dict at once so no greenlet sees a partial schedule
+    rps_schedules = schedules
 
     max_len = max((len(v) for v in rps_schedules.values()), default=0)
     return max_len
 
+def get_rps_schedules(dir_path="alibaba_workload"):
+    """
+    Returns the process-wide RPS schedules, parsing the CSVs on first use only.
+    """
+    if not rps_schedules:
+        with schedule_lock:
+            if not rps_schedules:
+                load_rps_files(dir_path)
+    return rps_schedules
+
 def periodic_rps_writer():
     """
     Background thread to periodically call record_rps().
@@ -330,9 +616,10 @@ def periodic_rps_writer():
     while True:
         try:
             record_rps()
-            time.sleep(15)
         except Exception as e:
             logging.info(f"rps writer error: {e}")
+        if rps_writer_stop.wait(15):
+            return
 
 # ---------------------------------------------------------------------------
 # Locust user behavior
@@ -343,22 +630,33 @@ class UserBehavior(TaskSet):
     def on_start(self):
         """
         On start:
-          - load RPS CSVs
-          - warm up with index()
-          - start Poisson replay for this user
+          - get the RPS schedules (parsed once per process)
+          - warm up with index() and log in as a random TeaStore user
+          - join the session pool and start the process-wide replay
         """
-        load_rps_files("alibaba_workload")
+        self.stopped = False
+        self.cart_items = 0
+        get_rps_schedules("alibaba_workload")
         index(self)
-        replay_poisson(self)
+        login(self)
+        client_pool.put(self)
+        start_replay(self.user.environment)
+
+    def on_stop(self):
+        """
+        Leave the session pool when Locust stops or removes this user.
+        """
+        self.stopped = True
 
     @task
     def _idle(self):
         """
         Keep Locust happy by having at least one @task.
-        All real work is done in the replay greenlets.
+        All real work is done in the replay greenlets; the user just yields
+        to the hub between no-op tasks, so it can be stopped at any time.
         """
-        time.sleep(3600)
+        pass
 
 class WebsiteUser(FastHttpUser):
     tasks = [UserBehavior]
-    wait_time = between(0, 0)
+    wait_time = constant(1)
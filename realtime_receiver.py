@@ -0,0 +1,73 @@
+#
+# Stand-in consumer for the Locust real-time stream (locustfile.py --realtime).
+# Accepts newline-delimited JSON frames on a TCP port and prints them or
+# appends them to a JSON lines file, e.g.
+#   python realtime_receiver.py --port 8003 --out rt_frames.jsonl
+#
+
+import argparse
+import json
+import logging
+import socketserver
+import threading
+
+
+class FrameHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                frame = json.loads(line)
+            except ValueError as e:
+                logging.warning(f"Dropping malformed frame from {self.client_address}: {e}")
+                continue
+            self.server.on_frame(frame)
+
+
+class FrameReceiver(socketserver.ThreadingTCPServer):
+    """
+    TCP server calling on_frame(frame) for every decoded frame. Also usable
+    in-process: start it with serve_forever() in a thread and read .frames.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="localhost", port=8003, out=None):
+        super().__init__((host, port), FrameHandler)
+        self.frames = []
+        self.lock = threading.Lock()
+        self.out = open(out, "a") if out else None
+
+    def on_frame(self, frame):
+        with self.lock:
+            self.frames.append(frame)
+            if self.out:
+                self.out.write(json.dumps(frame))
+                self.out.write("\n")
+                self.out.flush()
+            else:
+                print(f"schema={frame.get('schema')} t={frame.get('timestamp')} "
+                      f"window={frame.get('window_seconds')} metrics={len(frame.get('metrics', {}))}")
+
+    def server_close(self):
+        super().server_close()
+        if self.out:
+            self.out.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("-p", "--port", default=8003, type=int)
+    parser.add_argument("-o", "--out", default=None, help="Append frames to this JSON lines file instead of printing")
+    args = parser.parse_args()
+
+    receiver = FrameReceiver(args.host, args.port, args.out)
+    try:
+        receiver.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receiver.server_close()
@@ -0,0 +1,123 @@
+import json
+import logging
+import queue
+import select
+import socket
+import threading
+import time
+
+# Version of the frame layout below; bump when fields change meaning
+SCHEMA_VERSION = 1
+
+
+def build_frame(window_seconds, window, timestamp=None):
+    """
+    One real-time frame for a finished interval:
+      {"schema": 1, "timestamp": <epoch s>, "window_seconds": <s>,
+       "endpoints": [<endpoint>, ...],
+       "metrics": {"<endpoint>_rps": x, "<endpoint>_p95": x, "<endpoint>_p99": x, ...}}
+    window maps an endpoint name to its interval summary.
+    """
+    metrics = {}
+    for endpoint, data in window.items():
+        for field, value in data.items():
+            metrics[f"{endpoint}_{field}"] = value
+    return {
+        "schema": SCHEMA_VERSION,
+        "timestamp": time.time() if timestamp is None else timestamp,
+        "window_seconds": window_seconds,
+        "endpoints": [str(endpoint) for endpoint in window],
+        "metrics": metrics,
+    }
+
+
+class RealtimeStream:
+    """
+    Streams frames as newline-delimited JSON over one long-lived TCP
+    connection. send() only enqueues, so a slow or absent consumer never
+    stalls the caller; when the queue is full the oldest frame is dropped.
+    The sender thread reconnects with exponential backoff.
+    """
+
+    def __init__(self, host="localhost", port=8003, max_queue=1000, max_backoff=30.0, timeout=5.0):
+        self.address = (host, port)
+        self.frames = queue.Queue(maxsize=max_queue)
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.sock = None
+        self.dropped = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def send(self, frame):
+        while True:
+            try:
+                self.frames.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _connect(self):
+        backoff = 0.5
+        while not self.stopped.is_set():
+            try:
+                sock = socket.create_connection(self.address, timeout=self.timeout)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                return sock
+            except OSError as e:
+                logging.info(f"realtime stream: cannot connect to {self.address}: {e}")
+                self.stopped.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+        return None
+
+    def _peer_closed(self):
+        # A send to a peer that already hung up still "succeeds" once, so
+        # check for EOF before writing rather than losing that frame
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+            return bool(readable) and self.sock.recv(1, socket.MSG_PEEK) == b""
+        except OSError:
+            return True
+
+    def _run(self):
+        frame = None
+        while True:
+            if frame is None:
+                try:
+                    frame = self.frames.get(timeout=0.5)
+                except queue.Empty:
+                    if self.stopped.is_set():
+                        break
+                    continue
+            if self.sock is not None and self._peer_closed():
+                self.sock.close()
+                self.sock = None
+            if self.sock is None:
+                self.sock = self._connect()
+                if self.sock is None:
+                    break
+            try:
+                self.sock.sendall(json.dumps(frame).encode("utf-8") + b"\n")
+                frame = None
+            except OSError as e:
+                # Keep the frame and resend it on a fresh connection
+                logging.info(f"realtime stream: send failed, reconnecting: {e}")
+                self.sock.close()
+                self.sock = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def close(self, timeout=2.0):
+        """
+        Stop after flushing queued frames, waiting at most timeout seconds.
+        """
+        self.stopped.set()
+        self.thread.join(timeout)
+        if self.dropped:
+            logging.warning(f"realtime stream dropped {self.dropped} frames")
@@ -0,0 +1,55 @@
+import csv
+import os
+import threading
+import time
+
+# One row per endpoint per interval; "timestamp" is the end of the interval
+RPS_FIELDS = ["timestamp", "window_seconds", "name", "method",
+              "count", "rps", "p50", "p95", "p99", "p999", "error_rate"]
+
+RPS_FILENAME = "rps.csv"
+RT_RPS_FILENAME = "rt_rps.csv"
+
+
+class RpsLogWriter:
+    """
+    Append-only CSV log of per-interval endpoint statistics. The file stays
+    open for the whole run and is flushed at most every flush_interval
+    seconds (and on close), so a tick costs a buffered write, not an open().
+    """
+
+    def __init__(self, path, flush_interval=10.0):
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", newline="")
+        self.writer = csv.writer(self.file)
+        if new_file:
+            self.writer.writerow(RPS_FIELDS)
+        self.flush_interval = flush_interval
+        self.last_flush = time.time()
+        self.lock = threading.Lock()
+
+    def write_window(self, timestamp, window_seconds, window):
+        """
+        window maps (name, method) to a LatencyHistogram.summary() dict.
+        """
+        with self.lock:
+            for (name, method), data in window.items():
+                self.writer.writerow([f"{timestamp:.3f}", f"{window_seconds:.3f}", name, method,
+                                      data["count"], data["rps"], data["p50"], data["p95"],
+                                      data["p99"], data["p999"], data["error_rate"]])
+            if time.time() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def _flush(self):
+        self.file.flush()
+        self.last_flush = time.time()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self._flush()
+                self.file.close()
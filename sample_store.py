@@ -0,0 +1,107 @@
+import threading
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:
+    pa = None
+
+# One row per service per sample; ints are nullable so -1/<unknown> can be stored as null
+SAMPLE_FIELDS = [
+    ("timestamp", "float64"),     # scheduled sample time (epoch s)
+    ("sampled_at", "float64"),    # actual sample time (epoch s)
+    ("service", "string"),
+    ("cpu_util", "int32"),
+    ("cpu_target", "int32"),
+    ("mem_util", "int32"),
+    ("mem_target", "int32"),
+    ("min_replicas", "int32"),
+    ("max_replicas", "int32"),
+    ("replicas", "int32"),
+    ("age_seconds", "int64"),
+]
+
+SAMPLES_FILENAME = "samples.arrow"
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Columnar sample output requires pyarrow (pip install pyarrow)")
+
+
+def sample_schema():
+    _require_pyarrow()
+    return pa.schema([(name, getattr(pa, type_name)()) for name, type_name in SAMPLE_FIELDS])
+
+
+def _to_int(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value < 0 else value
+
+
+class ColumnarSampleWriter:
+    """
+    Appends typed sample rows to an Arrow IPC stream. Rows are buffered per
+    column and written as one record batch every batch_size rows, so the
+    file is valid up to the last flushed batch even if the collector dies,
+    and can be memory-mapped by the processing stage.
+
+    Safe to share between sampler threads.
+    """
+
+    def __init__(self, path, batch_size=256):
+        self.schema = sample_schema()
+        self.sink = pa.OSFile(path, "wb")
+        self.writer = ipc.new_stream(self.sink, self.schema)
+        self.batch_size = batch_size
+        self.columns = {name: [] for name, _ in SAMPLE_FIELDS}
+        self.lock = threading.Lock()
+
+    def append(self, sample, scheduled, actual, age_seconds):
+        row = {
+            "timestamp": scheduled,
+            "sampled_at": actual,
+            "service": sample["service"],
+            "cpu_util": _to_int(sample["cpu_util"]),
+            "cpu_target": _to_int(sample["cpu_target"]),
+            "mem_util": _to_int(sample["mem_util"]),
+            "mem_target": _to_int(sample["mem_target"]),
+            "min_replicas": _to_int(sample["min_pods"]),
+            "max_replicas": _to_int(sample["max_pods"]),
+            "replicas": _to_int(sample["replicas"]),
+            "age_seconds": age_seconds,
+        }
+        with self.lock:
+            for name, value in row.items():
+                self.columns[name].append(value)
+            if len(self.columns["timestamp"]) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if not self.columns["timestamp"]:
+            return
+        self.writer.write_batch(pa.record_batch(self.columns, schema=self.schema))
+        self.columns = {name: [] for name, _ in SAMPLE_FIELDS}
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.writer.close()
+            self.sink.close()
+
+
+def read_samples(path):
+    """
+    Memory-map an Arrow sample stream and return it as a pandas DataFrame.
+    """
+    _require_pyarrow()
+    with pa.memory_map(path, "r") as source:
+        table = ipc.open_stream(source).read_all()
+    return table.to_pandas()
@@ -0,0 +1,180 @@
+import json
+import logging
+import subprocess
+
+import yaml
+
+from utils import parse_quantity
+
+
+def normalize_quantity(resource, quantity):
+    """
+    Compare quantities by value: the API server returns "1" for a "1000m"
+    request and may rewrite memory units the same way.
+    """
+    quantity = str(quantity)
+    try:
+        if resource == "cpu":
+            return int(quantity[:-1]) if quantity.endswith("m") else round(float(quantity) * 1000)
+        return parse_quantity(quantity)
+    except ValueError:
+        return quantity
+
+
+def container_state(pod_spec):
+    """
+    The parts of each container an experiment changes: resources and env.
+    """
+    state = {}
+    for c in pod_spec.get("containers") or []:
+        resources = {side: {resource: normalize_quantity(resource, value)
+                            for resource, value in (c.get("resources") or {}).get(side, {}).items()}
+                     for side in ("requests", "limits")}
+        env = sorted((e["name"], e.get("value")) for e in c.get("env") or [])
+        state[c["name"]] = {"resources": resources, "env": env}
+    return state
+
+
+# What the API server fills into a partially specified behavior; a live HPA
+# showing exactly this behaves as if it had none
+DEFAULT_BEHAVIOR = {
+    "scaleUp": {"stabilizationWindowSeconds": 0, "selectPolicy": "Max",
+                "policies": [{"type": "Pods", "value": 4, "periodSeconds": 15},
+                             {"type": "Percent", "value": 100, "periodSeconds": 15}]},
+    "scaleDown": {"selectPolicy": "Max",
+                  "policies": [{"type": "Percent", "value": 100, "periodSeconds": 15}]},
+}
+
+
+def normalize_behavior(behavior):
+    if not behavior:
+        return None
+    normalized = {}
+    for direction, rules in behavior.items():
+        rules = dict(rules or {})
+        rules["policies"] = sorted(rules.get("policies") or [], key=lambda p: (p["type"], p["value"], p["periodSeconds"]))
+        normalized[direction] = rules
+    return normalized
+
+
+def has_custom_behavior(hpa):
+    behavior = normalize_behavior((hpa.get("spec") or {}).get("behavior"))
+    return behavior is not None and behavior != normalize_behavior(DEFAULT_BEHAVIOR)
+
+
+def hpa_state(hpa, compare_behavior):
+    spec = hpa.get("spec") or {}
+    state = {"scaleTargetRef": spec.get("scaleTargetRef"), "minReplicas": spec.get("minReplicas", 1),
+             "maxReplicas": spec.get("maxReplicas"), "metrics": spec.get("metrics") or []}
+    # The API server fills in defaults around a behavior we set, so compare
+    # it only when we set one (a leftover one is handled by the caller)
+    if compare_behavior:
+        state["behavior"] = spec.get("behavior")
+    return state
+
+
+def stack_deployed(desired_docs, live_items):
+    """
+    Whether any Deployment of the config is live, i.e. the stack is there to patch.
+    """
+    live = {(item["kind"], item["metadata"]["name"]) for item in live_items}
+    return any(("Deployment", d["metadata"]["name"]) in live
+               for d in desired_docs if isinstance(d, dict) and d.get("kind") == "Deployment")
+
+
+def diff_stack(desired_docs, live_items):
+    """
+    Compare a generated config with the live Deployments and HPAs of its
+    namespace. Returns (to_apply, hpas_to_delete, to_scale, behaviors_to_clear):
+      to_apply:           Deployments and HPAs that are missing or differ
+      hpas_to_delete:     names of live HPAs of the config's Deployments
+                          that the config no longer has; HPAs of anything
+                          else in the namespace are left alone
+      to_scale:           {deployment: baseline replicas} for Deployments
+                          that drifted from their baseline (e.g. scaled by
+                          the previous experiment's HPA)
+      behaviors_to_clear: names of HPAs the config gives no behavior that
+                          still carry a custom one from an earlier config
+    """
+    live = {(item["kind"], item["metadata"]["name"]): item for item in live_items}
+    desired = [d for d in desired_docs if isinstance(d, dict) and d.get("kind")]
+
+    to_apply, to_scale, behaviors_to_clear = [], {}, []
+    for d in desired:
+        key = (d["kind"], d["metadata"]["name"])
+        current = live.get(key)
+        if d["kind"] == "Deployment" and current is not None:
+            wanted = container_state(d["spec"]["template"]["spec"])
+            if (container_state(current["spec"]["template"]["spec"]) != wanted
+                    or (current["spec"]["template"]["spec"].get("nodeSelector") or {})
+                    != (d["spec"]["template"]["spec"].get("nodeSelector") or {})):
+                to_apply.append(d)
+            # apply leaves replicas alone when the manifest does not set them
+            if current["spec"].get("replicas", 1) != d["spec"].get("replicas", 1):
+                to_scale[key[1]] = d["spec"].get("replicas", 1)
+        elif d["kind"] == "HorizontalPodAutoscaler" and current is not None:
+            compare_behavior = "behavior" in (d.get("spec") or {})
+            if hpa_state(current, compare_behavior) != hpa_state(d, compare_behavior):
+                to_apply.append(d)
+            if not compare_behavior and has_custom_behavior(current):
+                behaviors_to_clear.append(key[1])
+        elif key not in live and d["kind"] in ("Deployment", "HorizontalPodAutoscaler"):
+            to_apply.append(d)
+
+    wanted_hpas = {d["metadata"]["name"] for d in desired if d["kind"] == "HorizontalPodAutoscaler"}
+    deployments = {d["metadata"]["name"] for d in desired if d["kind"] == "Deployment"}
+    hpas_to_delete = sorted(
+        name for (kind, name), item in live.items()
+        if kind == "HorizontalPodAutoscaler" and name not in wanted_hpas
+        and ((item.get("spec") or {}).get("scaleTargetRef") or {}).get("kind") == "Deployment"
+        and item["spec"]["scaleTargetRef"].get("name") in deployments)
+    return to_apply, hpas_to_delete, to_scale, behaviors_to_clear
+
+
+def _kubectl(cmd, stdin=None):
+    res = subprocess.run(cmd, shell=True, capture_output=True, text=True, input=stdin)
+    if res.returncode != 0:
+        logging.error(f"'{cmd}' failed: {res.stderr.strip()}")
+    return res
+
+
+def live_stack(namespace):
+    res = _kubectl(f"kubectl get deploy,hpa -n {namespace} -o json")
+    if res.returncode != 0 or not res.stdout.strip():
+        return []
+    return json.loads(res.stdout).get("items", [])
+
+
+def apply_incremental(config_file, namespace="default"):
+    """
+    Bring the live stack in namespace to config_file by touching only what
+    differs: apply the changed or missing objects, delete HPAs the config
+    dropped, remove leftover HPA behaviors and scale drifted Deployments
+    back to their baseline replicas.
+    A namespace without the stack gets the whole config applied.
+    Returns the number of objects changed.
+    """
+    with open(config_file) as f:
+        desired_docs = list(yaml.safe_load_all(f))
+    live_items = live_stack(namespace)
+    if not stack_deployed(desired_docs, live_items):
+        logging.info(f"No stack in namespace {namespace}, applying {config_file}")
+        _kubectl(f"kubectl apply -f {config_file}")
+        return len(desired_docs)
+
+    to_apply, hpas_to_delete, to_scale, behaviors_to_clear = diff_stack(desired_docs, live_items)
+
+    if to_apply:
+        logging.info("Applying changed objects: " + ", ".join(f"{d['kind']}/{d['metadata']['name']}" for d in to_apply))
+        _kubectl(f"kubectl apply -n {namespace} -f -", stdin=yaml.safe_dump_all(to_apply))
+    for name in hpas_to_delete:
+        logging.info(f"Deleting HorizontalPodAutoscaler/{name}")
+        _kubectl(f"kubectl delete hpa {name} -n {namespace}")
+    for name in behaviors_to_clear:
+        logging.info(f"Removing the behavior of HorizontalPodAutoscaler/{name}")
+        _kubectl(f"kubectl patch hpa {name} -n {namespace} --type=json "
+                 "-p '[{\"op\": \"remove\", \"path\": \"/spec/behavior\"}]'")
+    for name, replicas in to_scale.items():
+        logging.info(f"Scaling Deployment/{name} back to {replicas} replicas")
+        _kubectl(f"kubectl scale deployment {name} -n {namespace} --replicas={replicas}")
+    return len(to_apply) + len(hpas_to_delete) + len(to_scale) + len(behaviors_to_clear)
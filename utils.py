@@ -15,6 +15,10 @@ def interval_string_to_seconds(input: str) -> int:
         total += amount * multiple
     return total
 
+def format_age(elapsed_seconds):
+    m, s = divmod(int(elapsed_seconds), 60)
+    return f"{m}m{s}s" if m else f"{s}s"
+
 def parse_hpa_output(parts, metric_names, version):
     metric_values = []
     multiple_metric_values = {}
@@ -94,4 +98,43 @@ def parse_hpa_output(parts, metric_names, version):
     replica = int(parts[len(parts) - 2])
     timestamp = parts[len(parts) - 1]
 
-    return metric_values, multiple_metric_values, thresholds, replica, timestamp
\ No newline at end of file
+    return metric_values, multiple_metric_values, thresholds, replica, timestamp
+
+
+def parse_quantity(quantity):
+    """
+    Parse kubernetes resource quantity to raw value.
+    n -> nano (values / 10^6, in millicores)
+    u -> micro (values / 1000, in millicores)
+    m -> milli (values / 1000)
+    Ki -> 1024
+    Mi -> 1024^2
+    Gi -> 1024^3
+    """
+    if not quantity:
+        return 0
+
+    # Handle nano- and microcores as reported by metrics.k8s.io
+    if quantity.endswith('n'):
+        return int(quantity[:-1]) / 10 ** 6
+    if quantity.endswith('u'):
+        return int(quantity[:-1]) / 10 ** 3
+
+    # Handle millicores
+    if quantity.endswith('m'):
+        return int(quantity[:-1])
+
+    # Handle limits (bytes)
+    multipliers = {
+        'Ki': 1024,
+        'Mi': 1024 ** 2,
+        'Gi': 1024 ** 3,
+        'Ti': 1024 ** 4
+    }
+
+    for suffix, multiplier in multipliers.items():
+        if quantity.endswith(suffix):
+            return int(quantity[:-len(suffix)]) * multiplier
+
+    # Plain integer
+    return int(quantity)